@@ -1,9 +1,12 @@
-from bpy.types import Operator
-from bpy.props import (EnumProperty, FloatProperty)
+from bpy.types import AddonPreferences, Operator, OperatorFileListElement
+from bpy.props import (BoolProperty, CollectionProperty, EnumProperty, FloatProperty, IntProperty, StringProperty)
 from bpy_extras.io_utils import (ImportHelper, axis_conversion)
 import bpy
+import os
+import tempfile
 from mathutils import Matrix
-from .xfile_importer import load
+from .xfile_importer import (TextureResolver, find_files, load, load_files, session_textures)
+from .xfile_cache import XFileCache
 
 bl_info = {
     "name": "DirectX XFile format",
@@ -14,6 +17,64 @@ bl_info = {
 }
 
 
+class XFilePreferences(AddonPreferences):
+    bl_idname = __package__
+
+    use_cache: BoolProperty(
+        name="Cache Parsed Files",
+        description="Keep parsed files on disk, so that importing them again skips parsing",
+        default=False,
+    )
+
+    cache_directory: StringProperty(
+        name="Cache Directory",
+        description="Directory of the parse cache, the temporary directory if empty",
+        subtype='DIR_PATH',
+    )
+
+    cache_size: IntProperty(
+        name="Cache Size (MB)",
+        description="Least recently used files are removed from the cache beyond this size",
+        default=1024,
+        min=1,
+    )
+
+    reuse_textures: BoolProperty(
+        name="Reuse Textures",
+        description="Remember the images of textures between imports instead of looking them up again",
+        default=False,
+    )
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "reuse_textures")
+        layout.prop(self, "use_cache")
+        row = layout.row()
+        row.active = self.use_cache
+        row.prop(self, "cache_directory")
+        row.prop(self, "cache_size")
+
+
+def get_cache(context) -> XFileCache | None:
+    addon = context.preferences.addons.get(__package__)
+    if addon is None or not addon.preferences.use_cache:
+        return None
+    preferences = addon.preferences
+    directory = bpy.path.abspath(preferences.cache_directory)
+    if not directory:
+        directory = os.path.join(tempfile.gettempdir(), 'blender_xfile_cache')
+    return XFileCache(directory, preferences.cache_size * 1024 * 1024)
+
+
+def get_textures(context) -> TextureResolver:
+    addon = context.preferences.addons.get(__package__)
+    if addon is None or not addon.preferences.reuse_textures:
+        return TextureResolver()
+    # textures added since the last import are found
+    session_textures.forget_missing()
+    return session_textures
+
+
 # ImportHelper is a helper class, defines filename and
 # invoke() function which calls the file selector.
 
@@ -26,6 +87,17 @@ class ImportSomeData(Operator, ImportHelper):
     # ImportHelper mixin class uses this
     filename_ext = ".x"
 
+    # selected files, or a directory to import all of its .x files from
+    files: CollectionProperty(
+        type=OperatorFileListElement,
+        options={'HIDDEN', 'SKIP_SAVE'},
+    )
+
+    directory: StringProperty(
+        subtype='DIR_PATH',
+        options={'HIDDEN', 'SKIP_SAVE'},
+    )
+
     scale: FloatProperty(
         name="Scale",
         default=1.0,
@@ -61,6 +133,49 @@ class ImportSomeData(Operator, ImportHelper):
         default='Y',
     )
 
+    merge_vertices: BoolProperty(
+        name="Merge Vertices",
+        description="Merge vertices with the same position, texture coordinates and colors",
+        default=False,
+    )
+
+    triangulate: BoolProperty(
+        name="Triangulate",
+        description="Split polygons into triangles instead of importing them as n-gons",
+        default=False,
+    )
+
+    use_normals: BoolProperty(
+        name="Normals",
+        description="Import custom normals",
+        default=True,
+    )
+
+    use_vertex_colors: BoolProperty(
+        name="Vertex Colors",
+        description="Read vertex colors",
+        default=True,
+    )
+
+    use_skinning: BoolProperty(
+        name="Skinning",
+        description="Read skin weights",
+        default=True,
+    )
+
+    use_animation: BoolProperty(
+        name="Animation",
+        description="Read animation sets",
+        default=True,
+    )
+
+    workers: IntProperty(
+        name="Processes",
+        description="Number of processes parsing multiple files, 0 uses one per CPU",
+        default=0,
+        min=0,
+    )
+
     def execute(self, context):
         orientation_matrix = axis_conversion(
             from_forward=self.forward_axis,
@@ -68,7 +183,29 @@ class ImportSomeData(Operator, ImportHelper):
         ).to_4x4()
         scale_matrix = Matrix.Scale(self.scale, 4)
         global_matrix = orientation_matrix @ scale_matrix
-        load(self.filepath, global_matrix)
+        # data objects which are skipped without parsing them
+        exclude = set()
+        if not self.use_normals:
+            exclude.add('MeshNormals')
+        if not self.use_vertex_colors:
+            exclude.add('MeshVertexColors')
+        if not self.use_skinning:
+            exclude.update(('XSkinMeshHeader', 'SkinWeights'))
+        if not self.use_animation:
+            exclude.update(('AnimTicksPerSecond', 'AnimationSet'))
+        cache = get_cache(context)
+        textures = get_textures(context)
+        filepaths = [os.path.join(self.directory, f.name) for f in self.files if f.name]
+        if not filepaths and self.directory and not os.path.isfile(self.filepath):
+            filepaths = find_files(self.directory)
+        if len(filepaths) <= 1:
+            load(filepaths[0] if filepaths else self.filepath, global_matrix, exclude,
+                 self.merge_vertices, self.triangulate, cache, textures)
+            return {'FINISHED'}
+        failed = load_files(filepaths, global_matrix, exclude, self.merge_vertices, self.triangulate,
+                            self.workers or None, cache, textures)
+        for filepath, error in failed:
+            self.report({'WARNING'}, "%s: %s" % (os.path.basename(filepath), error))
         return {'FINISHED'}
 
 # Only needed if you want to add into a dynamic menu
@@ -81,11 +218,13 @@ def menu_func_import(self, context):
 
 
 def register():
+    bpy.utils.register_class(XFilePreferences)
     bpy.utils.register_class(ImportSomeData)
     bpy.types.TOPBAR_MT_file_import.append(menu_func_import)
 
 
 def unregister():
+    bpy.utils.unregister_class(XFilePreferences)
     bpy.utils.unregister_class(ImportSomeData)
     bpy.types.TOPBAR_MT_file_import.remove(menu_func_import)
 
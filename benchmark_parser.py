@@ -0,0 +1,242 @@
+""" Benchmarks XFileParser on the bundled models and on synthetic meshes.
+
+Runs without Blender:
+
+    python benchmark_parser.py --output bench.json
+    python benchmark_parser.py --compare bench.json
+
+Results are written as JSON so that runs of different commits can be compared.
+A comparison exits with status 1 if a case got slower than the threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import struct
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+from xfile_parser import XFileParser, TOKENIZER_REGEX, TOKENIZER_BYTEWISE
+
+MODEL_DIRECTORIES = ['models', 'models-nonbsd']
+GRID_SIZES = [64, 256, 512]
+# slowdowns below this many seconds are timer noise on the small models
+NOISE_FLOOR = 0.0005
+
+
+def grid_mesh(size: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """ returns positions, normals, texture coordinates and quad indices of a wavy grid """
+    u, v = np.meshgrid(np.linspace(0, 1, size), np.linspace(0, 1, size))
+    u = u.ravel()
+    v = v.ravel()
+    positions = np.column_stack([u * 10, v * 10, np.sin(u * 20) * np.cos(v * 20)])
+    normals = np.column_stack([np.zeros_like(u), np.zeros_like(u), np.ones_like(u)])
+    texCoords = np.column_stack([u, v])
+    corner = (np.arange(size - 1)[:, None] * size + np.arange(size - 1)).ravel()
+    quads = np.column_stack([corner, corner + 1, corner + size + 1, corner + size])
+    return positions, normals, texCoords, quads
+
+
+def grid_text(size: int) -> bytes:
+    """ writes a grid mesh as a text XFile """
+    positions, normals, texCoords, quads = grid_mesh(size)
+
+    def vectors(values):
+        return b',\n'.join(b''.join(b'%.6f;' % x for x in row) for row in values) + b';\n'
+
+    faces = b',\n'.join(b'4;%d,%d,%d,%d;' % tuple(q) for q in quads.tolist()) + b';\n'
+    out = [b'xof 0303txt 0032\n',
+           b'Frame Grid {\n',
+           b' FrameTransformMatrix {\n  1.0,0.0,0.0,0.0,0.0,1.0,0.0,0.0,0.0,0.0,1.0,0.0,0.0,0.0,0.0,1.0;;\n }\n',
+           b' Mesh {\n%d;\n' % len(positions), vectors(positions.tolist()),
+           b'%d;\n' % len(quads), faces,
+           b'  MeshNormals {\n%d;\n' % len(normals), vectors(normals.tolist()),
+           b'%d;\n' % len(quads), faces, b'  }\n',
+           b'  MeshTextureCoords {\n%d;\n' % len(texCoords), vectors(texCoords.tolist()), b'  }\n',
+           b' }\n}\n']
+    return b''.join(out)
+
+
+def grid_binary(size: int) -> bytes:
+    """ writes a grid mesh as a binary XFile with 32 bit floats """
+    positions, normals, texCoords, quads = grid_mesh(size)
+
+    def name(s: bytes) -> bytes:
+        return struct.pack('<HI', 1, len(s)) + s
+
+    def int_list(values) -> bytes:
+        values = np.asarray(values, dtype='<u4').ravel()
+        return struct.pack('<HI', 6, len(values)) + values.tobytes()
+
+    def float_list(values) -> bytes:
+        values = np.asarray(values, dtype='<f4').ravel()
+        return struct.pack('<HI', 7, len(values)) + values.tobytes()
+
+    open_brace = struct.pack('<H', 0x0a)
+    close_brace = struct.pack('<H', 0x0b)
+    faces = int_list(np.concatenate([[len(quads)], np.column_stack(
+        [np.full(len(quads), 4), quads]).ravel()]))
+    out = [b'xof 0303bin 0032',
+           name(b'Frame'), name(b'Grid'), open_brace,
+           name(b'FrameTransformMatrix'), open_brace, float_list(np.eye(4)), close_brace,
+           name(b'Mesh'), open_brace, int_list([len(positions)]), float_list(positions), faces,
+           name(b'MeshNormals'), open_brace, int_list([len(normals)]), float_list(normals), faces,
+           close_brace,
+           name(b'MeshTextureCoords'), open_brace, int_list([len(texCoords)]), float_list(texCoords),
+           close_brace,
+           close_brace, close_brace]
+    return b''.join(out)
+
+
+def bundled_cases() -> list[tuple[str, bytes]]:
+    cases = []
+    for directory in MODEL_DIRECTORIES:
+        for filename in sorted(os.listdir(directory)):
+            path = os.path.join(directory, filename)
+            with open(path, 'br') as f:
+                buffer = f.read()
+            if buffer[:4] == b'xof ':
+                cases.append((path, buffer))
+    return cases
+
+
+def synthetic_cases(sizes: list[int]) -> list[tuple[str, bytes]]:
+    cases = []
+    for size in sizes:
+        cases.append(('grid%d_text' % size, grid_text(size)))
+        cases.append(('grid%d_binary' % size, grid_binary(size)))
+    return cases
+
+
+def count_tokens(buffer: bytes, tokenizer: str) -> tuple[int, float]:
+    """ counts the tokens of a file. Returns the count and the seconds taken by
+    the tokenizer alone. The parser is created beforehand with an empty include
+    set, so that its own pass only skips the data objects
+    """
+    parser = XFileParser(buffer, tokenizer=tokenizer, include=())
+    parser.p = 0 if buffer[8:12] in (b'tzip', b'bzip') else 16
+    parser.binaryNumCount = 0
+    count = 0
+    start = time.perf_counter()
+    while parser.GetNextToken():
+        count += 1
+    return count, time.perf_counter() - start
+
+
+def bench_case(name: str, buffer: bytes, tokenizer: str, repeat: int) -> dict:
+    result = {'name': name, 'format': buffer[8:12].decode().strip(), 'bytes': len(buffer)}
+    try:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            XFileParser(buffer, tokenizer=tokenizer)
+            times.append(time.perf_counter() - start)
+        tokens, tokenTime = count_tokens(buffer, tokenizer)
+        tracemalloc.start()
+        XFileParser(buffer, tokenizer=tokenizer)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    except Exception as e:
+        result['error'] = '%s: %s' % (type(e).__name__, e)
+        return result
+    best = min(times)
+    result.update({
+        'seconds': best,
+        'median_seconds': statistics.median(times),
+        'mb_per_second': len(buffer) / best / 1e6 if best > 0 else 0.0,
+        'tokens': tokens,
+        'tokens_per_second': tokens / tokenTime if tokenTime > 0 else 0.0,
+        'peak_memory': peak,
+    })
+    return result
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: list[dict]):
+    print('%-40s %6s %10s %10s %9s %12s %10s' %
+          ('case', 'format', 'size KB', 'ms', 'MB/s', 'tokens/s', 'peak KB'))
+    for r in results:
+        if 'error' in r:
+            print('%-40s %6s %10.1f  %s' % (r['name'], r['format'], r['bytes'] / 1024, r['error']))
+            continue
+        print('%-40s %6s %10.1f %10.2f %9.2f %12.0f %10.1f' %
+              (r['name'], r['format'], r['bytes'] / 1024, r['seconds'] * 1000,
+               r['mb_per_second'], r['tokens_per_second'], r['peak_memory'] / 1024))
+
+
+def compare(results: list[dict], baseline: dict, threshold: float) -> bool:
+    """ prints the change against a baseline run and returns whether any case regressed """
+    old = {r['name']: r for r in baseline['results'] if 'error' not in r}
+    regressed = False
+    print('\ncompared with %s (%s)' % (baseline.get('revision') or 'baseline', baseline.get('tokenizer')))
+    print('%-40s %10s %10s %8s' % ('case', 'old ms', 'new ms', 'change'))
+    for r in results:
+        if 'error' in r or r['name'] not in old:
+            continue
+        before = old[r['name']]['seconds']
+        change = r['seconds'] / before - 1 if before > 0 else 0.0
+        mark = ''
+        if change > threshold and r['seconds'] - before > NOISE_FLOOR:
+            mark = '  REGRESSION'
+            regressed = True
+        print('%-40s %10.2f %10.2f %+7.1f%%%s' %
+              (r['name'], before * 1000, r['seconds'] * 1000, change * 100, mark))
+    return regressed
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tokenizer', choices=[TOKENIZER_REGEX, TOKENIZER_BYTEWISE],
+                        default=TOKENIZER_REGEX)
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of timed parses per case, the fastest one is reported')
+    parser.add_argument('--sizes', type=int, nargs='*', default=GRID_SIZES,
+                        help='edge lengths of the synthetic grid meshes')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON file of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative slowdown reported as regression')
+    args = parser.parse_args(argv)
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    # the bundled models contain data objects the parser warns about
+    warnings.simplefilter('ignore')
+    results = []
+    for name, buffer in bundled_cases() + synthetic_cases(args.sizes):
+        results.append(bench_case(name, buffer, args.tokenizer, args.repeat))
+    print_results(results)
+
+    run = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'tokenizer': args.tokenizer,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
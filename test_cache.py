@@ -0,0 +1,102 @@
+import io
+import os
+import tempfile
+import unittest
+import numpy as np
+from xfile_parser import ParseXFile
+from xfile_cache import XFileCache, SaveScene, LoadScene
+
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_save_load(self):
+        scene = ParseXFile('models-nonbsd/dwarf.x')
+        f = io.BytesIO()
+        SaveScene(scene, f)
+        f.seek(0)
+        loaded = LoadScene(f)
+        mesh = scene.rootNode.children[1].meshes[0]
+        loadedMesh = loaded.rootNode.children[1].meshes[0]
+        self.assertEqual(loaded.rootNode.children[1].name, scene.rootNode.children[1].name)
+        self.assertIs(loaded.rootNode.children[1].parent, loaded.rootNode)
+        self.assertEqual(loaded.rootNode.children[1].trafoMatrix, scene.rootNode.children[1].trafoMatrix)
+        self.assertTrue(np.array_equal(loadedMesh.positions, mesh.positions))
+        self.assertTrue(np.array_equal(loadedMesh.faceIndices, mesh.faceIndices))
+        self.assertEqual(loadedMesh.materials[0].textures[0].name, mesh.materials[0].textures[0].name)
+        self.assertEqual([(w.vertex, w.weight) for w in loadedMesh.bones[0].weights],
+                         [(w.vertex, w.weight) for w in mesh.bones[0].weights])
+        self.assertEqual(loaded.anims[0].anims[0].boneName, scene.anims[0].anims[0].boneName)
+        self.assertEqual(loaded.anims[0].anims[0].rotKeys, scene.anims[0].anims[0].rotKeys)
+
+    def test_save_load_data_objects(self):
+        scene = ParseXFile('models/kwxport_test_cubewithvcolors.x', decodeUnknown=True)
+        f = io.BytesIO()
+        SaveScene(scene, f)
+        f.seek(0)
+        loaded = LoadScene(f)
+        self.assertEqual(loaded.dataObjects[1].values['value'], scene.dataObjects[1].values['value'])
+        declData = scene.rootNode.meshes[0].dataObjects[0]
+        loadedDeclData = loaded.rootNode.meshes[0].dataObjects[0]
+        self.assertEqual(loadedDeclData.templateName, 'DeclData')
+        self.assertEqual(loadedDeclData.values['Elements'].dtype, declData.values['Elements'].dtype)
+        self.assertTrue(np.array_equal(loadedDeclData.values['data'], declData.values['data']))
+
+    def test_cache_hit(self):
+        cache = XFileCache(self.directory.name)
+        scene = cache.ParseXFile('models/test.x')
+        self.assertEqual(len(os.listdir(self.directory.name)), 1)
+        with open('models/test.x', 'rb') as f:
+            key = cache.Key(f.read())
+        cached = cache.Load(key)
+        self.assertIsNotNone(cached)
+        self.assertTrue(np.array_equal(cached.rootNode.meshes[0].positions, scene.rootNode.meshes[0].positions))
+        # filtered scenes are different entries
+        scene = cache.ParseXFile('models/test.x', exclude={'MeshNormals'})
+        self.assertEqual(len(scene.rootNode.meshes[0].normals), 0)
+        self.assertEqual(len(os.listdir(self.directory.name)), 2)
+
+    def test_corrupt_entry(self):
+        cache = XFileCache(self.directory.name)
+        scene = cache.ParseXFile('models/test.x')
+        with open('models/test.x', 'rb') as f:
+            key = cache.Key(f.read())
+        with open(cache.Path(key), 'r+b') as f:
+            f.truncate(100)
+        # a corrupt entry is a miss, it is removed and stored again
+        self.assertIsNone(cache.Load(key))
+        self.assertFalse(os.path.exists(cache.Path(key)))
+        reparsed = cache.ParseXFile('models/test.x')
+        self.assertTrue(np.array_equal(reparsed.rootNode.meshes[0].positions, scene.rootNode.meshes[0].positions))
+        self.assertIsNotNone(cache.Load(key))
+
+    def test_evict(self):
+        cache = XFileCache(self.directory.name, 0)
+        cache.ParseXFile('models/test.x')
+        self.assertEqual(os.listdir(self.directory.name), [])
+        cache.maxSize = 1 << 20
+        for filename in ['models/test.x', 'models/test_cube_text.x']:
+            cache.ParseXFile(filename)
+        self.assertEqual(len(os.listdir(self.directory.name)), 2)
+        older, newer = [os.path.join(self.directory.name, name) for name in os.listdir(self.directory.name)]
+        os.utime(older, (0, 0))
+        cache.maxSize = os.path.getsize(newer)
+        cache.Evict()
+        self.assertEqual(os.listdir(self.directory.name), [os.path.basename(newer)])
+
+    def test_parse_files(self):
+        cache = XFileCache(self.directory.name)
+        filenames = ['models/test.x', 'models/missing.x', 'models/test_cube_text.x']
+        first = dict(cache.ParseXFiles(filenames, 1))
+        second = dict(cache.ParseXFiles(filenames, 1))
+        self.assertIsInstance(first['models/missing.x'], FileNotFoundError)
+        self.assertIsInstance(second['models/missing.x'], FileNotFoundError)
+        for filename in ['models/test.x', 'models/test_cube_text.x']:
+            self.assertEqual(len(first[filename].rootNode.children), len(second[filename].rootNode.children))
+
+
+if __name__ == '__main__':
+    unittest.main()
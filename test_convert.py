@@ -0,0 +1,126 @@
+import contextlib
+import io
+import json
+import os
+import struct
+import tempfile
+import unittest
+from urllib.parse import unquote
+import numpy as np
+from xfile_parser import ParseXFile
+from xfile_cache import LoadScene
+from xfile_convert import GLB_MAGIC, GLB_CHUNK_JSON, GLB_CHUNK_BIN, texture_uri, write_glb, main
+
+
+def read_glb(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, length = struct.unpack_from('<III', data)
+    assert (magic, version, length) == (GLB_MAGIC, 2, len(data))
+    jsonLength, chunkType = struct.unpack_from('<II', data, 12)
+    assert chunkType == GLB_CHUNK_JSON and jsonLength % 4 == 0
+    document = json.loads(data[20:20 + jsonLength])
+    binLength, chunkType = struct.unpack_from('<II', data, 20 + jsonLength)
+    assert chunkType == GLB_CHUNK_BIN
+    return document, data[28 + jsonLength:28 + jsonLength + binLength]
+
+
+def read_accessor(document, binary, index):
+    accessor = document['accessors'][index]
+    view = document['bufferViews'][accessor['bufferView']]
+    dtype = np.float32 if accessor['componentType'] == 5126 else np.uint32
+    width = {'SCALAR': 1, 'VEC2': 2, 'VEC3': 3, 'VEC4': 4}[accessor['type']]
+    values = np.frombuffer(binary, dtype, accessor['count'] * width, view['byteOffset'])
+    return values.reshape(-1, width) if width > 1 else values
+
+
+class ConvertTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_glb(self):
+        scene = ParseXFile('models/test_cube_text.x')
+        path = os.path.join(self.directory.name, 'cube.glb')
+        write_glb(scene, path)
+        document, binary = read_glb(path)
+        self.assertEqual(document['asset']['version'], '2.0')
+        self.assertEqual(len(document['meshes']), 1)
+        primitive = document['meshes'][0]['primitives'][0]
+        # corners with different normals are split into 24 vertices
+        positions = read_accessor(document, binary, primitive['attributes']['POSITION'])
+        self.assertEqual(len(positions), 24)
+        indices = read_accessor(document, binary, primitive['indices'])
+        self.assertEqual(len(indices), 36)
+        self.assertLess(indices.max(), len(positions))
+        mesh = scene.rootNode.children[0].meshes[0]
+        # Z is mirrored from the left-handed XFile
+        expected = np.unique(mesh.positions * (1, 1, -1), axis=0)
+        self.assertTrue(np.allclose(np.unique(positions, axis=0), expected))
+        self.assertEqual(len(document['materials']), 1)
+
+    def test_frames(self):
+        data = (b'xof 0303txt 0032\n'
+                b'Frame Root {\n FrameTransformMatrix { 1,0,0,0, 0,1,0,0, 0,0,1,0, 1,2,3,1;; }\n'
+                b' Frame Child {\n  Mesh {\n 4;\n 0;0;0;, 1;0;0;, 1;1;0;, 0;1;0;;\n 1;\n 4;0,1,2,3;;\n }\n }\n}\n')
+        filepath = os.path.join(self.directory.name, 'frames.x')
+        with open(filepath, 'wb') as f:
+            f.write(data)
+        path = os.path.join(self.directory.name, 'frames.glb')
+        write_glb(ParseXFile(filepath), path)
+        document, binary = read_glb(path)
+        root = document['nodes'][document['scenes'][0]['nodes'][0]]
+        self.assertEqual(root['name'], 'Root')
+        self.assertEqual(root['matrix'][12:15], [1.0, 2.0, -3.0])
+        child = document['nodes'][root['children'][0]]
+        self.assertEqual(child['name'], 'Child')
+        self.assertNotIn('matrix', child)
+        primitive = document['meshes'][child['mesh']]['primitives'][0]
+        # the quad is fanned into two triangles with reversed winding
+        self.assertEqual(read_accessor(document, binary, primitive['indices']).tolist(), [0, 2, 1, 0, 3, 2])
+
+    def test_main(self):
+        output = os.path.join(self.directory.name, 'converted')
+        report = os.path.join(self.directory.name, 'report.json')
+        missing = os.path.join(self.directory.name, 'missing.x')
+        result = main(['models', missing, '--output', output, '--workers', '2', '--report', report])
+        self.assertEqual(result, 1)
+        with open(report) as f:
+            files = json.load(f)['files']
+        self.assertEqual([f['path'] for f in files if 'error' in f], [missing])
+        converted = [f for f in files if 'error' not in f]
+        self.assertEqual(len(converted), len([n for n in os.listdir('models') if n.lower().endswith('.x')]))
+        for f in converted:
+            self.assertEqual(set(f['seconds']), {'parse', 'npz', 'glb'})
+        loaded = LoadScene(os.path.join(output, 'test.npz'))
+        scene = ParseXFile('models/test.x')
+        self.assertTrue(np.array_equal(loaded.rootNode.meshes[0].positions, scene.rootNode.meshes[0].positions))
+        self.assertTrue(os.path.exists(os.path.join(output, 'test.glb')))
+
+    def test_texture_uris(self):
+        output = os.path.join(self.directory.name, 'converted')
+        filenames = ['models-nonbsd/dwarf.x', 'models/kwxport_test_cubewithvcolors.x', 'models/anim_test.x']
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            self.assertEqual(main(filenames + ['--output', output, '--format', 'glb', '--workers', '1']), 0)
+        # only the timing table is printed, the parser warns about unknown data objects
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split()[0] for line in lines[1:-1]], filenames)
+        uris = {}
+        for filename in filenames:
+            name = os.path.splitext(os.path.basename(filename))[0] + '.glb'
+            document, _ = read_glb(os.path.join(output, name))
+            uris[name] = [image['uri'] for image in document.get('images', [])]
+        # relative to the .glb file, the kwxport textures are found next to the XFile
+        self.assertEqual(len(uris['dwarf.glb']), 2)
+        self.assertEqual(len(uris['kwxport_test_cubewithvcolors.glb']), 3)
+        for uri in uris['dwarf.glb'] + uris['kwxport_test_cubewithvcolors.glb']:
+            self.assertTrue(os.path.isfile(os.path.join(output, unquote(uri))), uri)
+        # the texture name of the material is empty
+        self.assertEqual(uris['anim_test.glb'], [])
+        self.assertEqual(texture_uri(b'C:\\missing\\a b.tga', 'models', output), 'file:///C:/missing/a%20b.tga')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,8 @@
 import unittest
 import os
+import tempfile
 import bpy
+from mathutils import Matrix
 
 class ImporterTest(unittest.TestCase):
     def test_addon_enabled(self):
@@ -11,6 +13,132 @@ class ImporterTest(unittest.TestCase):
         result = bpy.ops.import_scene.x(filepath=filepath)
         self.assertSetEqual(result, {'FINISHED'})
 
+    def import_meshes(self, filename, **kwargs):
+        filepath = os.path.join(os.path.dirname(__file__), 'models', filename)
+        before = set(bpy.data.objects)
+        result = bpy.ops.import_scene.x(filepath=filepath, **kwargs)
+        self.assertSetEqual(result, {'FINISHED'})
+        return [o.data for o in bpy.data.objects if o not in before and o.type == 'MESH']
+
+    def test_shared_vertices(self):
+        mesh = self.import_meshes('test_cube_text.x')[0]
+        self.assertEqual(len(mesh.vertices), 24)
+        self.assertEqual(len(mesh.loops), 36)
+        mesh = self.import_meshes('test_cube_text.x', merge_vertices=True)[0]
+        self.assertEqual(len(mesh.vertices), 8)
+        self.assertEqual(len(mesh.loops), 36)
+
+    def test_ngons(self):
+        data = (b'xof 0303txt 0032\n'
+                b'Mesh {\n 7;\n 0;0;0;, 1;0;0;, 2;1;0;, 1;2;0;, 0;2;0;, -1;1;0;, 3;3;0;;\n'
+                b' 2;\n 6;0,1,2,3,4,5;, 3;1,6,2;;\n}\n')
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, 'ngon.x')
+            with open(filepath, 'wb') as f:
+                f.write(data)
+            mesh = self.import_meshes(filepath)[0]
+            self.assertEqual([len(p.vertices) for p in mesh.polygons], [6, 3])
+            mesh = self.import_meshes(filepath, triangulate=True)[0]
+            self.assertEqual([len(p.vertices) for p in mesh.polygons], [3, 3, 3, 3, 3])
+
+    def test_shared_textures(self):
+        # the texture paths are absolute ones of the exporting machine
+        first = self.import_meshes('kwxport_test_cubewithvcolors.x')[0]
+        second = self.import_meshes('kwxport_test_cubewithvcolors.x')[0]
+        images = [m.node_tree.nodes['Image Texture'].image for m in first.materials]
+        self.assertEqual(len(set(images)), 3)
+        self.assertEqual(images, [m.node_tree.nodes['Image Texture'].image for m in second.materials])
+
+    def test_shared_materials(self):
+        mesh = (b'Mesh {\n 3;\n 0;0;0;, 1;0;0;, 0;1;0;;\n 1;\n 3;0,1,2;;\n'
+                b' MeshMaterialList {\n 1;\n 1;\n 0;;\n %s\n }\n}\n')
+        data = (b'xof 0303txt 0032\n'
+                b'Material Red {\n 1.0;0.0;0.0;1.0;;\n 10.0;\n 0.0;0.0;0.0;;\n 0.0;0.0;0.0;;\n}\n'
+                + mesh % b'{ Red }' + mesh % b'{Red}'
+                + mesh % b'Material Copy { 1.0;0.0;0.0;1.0;; 10.0; 0.0;0.0;0.0;; 0.0;0.0;0.0;; }')
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, 'materials.x')
+            with open(filepath, 'wb') as f:
+                f.write(data)
+            meshes = self.import_meshes(filepath)
+        self.assertEqual(len(meshes), 3)
+        materials = set(m.materials[0] for m in meshes)
+        self.assertEqual(len(materials), 1)
+        self.assertEqual(materials.pop().name, 'Red')
+
+    def test_animation(self):
+        filepath = os.path.join(os.path.dirname(__file__), 'models', 'anim_test.x')
+        before = set(bpy.data.objects)
+        result = bpy.ops.import_scene.x(filepath=filepath)
+        self.assertSetEqual(result, {'FINISHED'})
+        armature = [o for o in bpy.data.objects if o not in before and o.type == 'ARMATURE'][0]
+        action = armature.animation_data.action
+        self.assertTrue(action.name.startswith('cylinder_test'))
+        self.assertEqual(tuple(action.frame_range), (1.0, 24.0))
+        # the first key is the rest pose of the frame
+        bpy.context.scene.frame_set(1)
+        basis = armature.pose.bones['joint2'].matrix_basis
+        for row, expected in zip(basis, Matrix.Identity(4)):
+            for a, b in zip(row, expected):
+                self.assertAlmostEqual(a, b, places=4)
+
+    def test_skinning(self):
+        filepath = os.path.join(os.path.dirname(__file__), 'models-nonbsd', 'dwarf.x')
+        before = set(bpy.data.objects)
+        result = bpy.ops.import_scene.x(filepath=filepath, merge_vertices=True)
+        self.assertSetEqual(result, {'FINISHED'})
+        obj = [o for o in bpy.data.objects if o not in before and o.type == 'MESH'][0]
+        armature = obj.modifiers['Armature'].object
+        self.assertIs(obj.parent, armature)
+        self.assertEqual(len(obj.vertex_groups), 40)
+        for group in obj.vertex_groups:
+            self.assertIn(group.name, armature.data.bones)
+        for vertex in obj.data.vertices[:100]:
+            self.assertAlmostEqual(sum(g.weight for g in vertex.groups), 1.0, places=4)
+
+    def test_instancing(self):
+        frame = (b'Frame %s {\n Mesh {\n 3;\n 0;0;0;, 1;0;0;, 0;%d;0;;\n 1;\n 3;0,1,2;;\n }\n}\n')
+        data = b'xof 0303txt 0032\n' + frame % (b'A', 1) + frame % (b'B', 1) + frame % (b'C', 2)
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, 'instances.x')
+            with open(filepath, 'wb') as f:
+                f.write(data)
+            meshes = self.import_meshes(filepath)
+        self.assertEqual(len(meshes), 3)
+        self.assertIs(meshes[0], meshes[1])
+        self.assertIsNot(meshes[0], meshes[2])
+
+    def test_instancing_per_file(self):
+        # texture names are resolved next to each file, so files do not share meshes
+        frame = b'Frame A {\n Mesh {\n 3;\n 0;0;0;, 1;0;0;, 0;1;0;;\n 1;\n 3;0,1,2;;\n }\n}\n'
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ['first.x', 'second.x']:
+                with open(os.path.join(directory, name), 'wb') as f:
+                    f.write(b'xof 0303txt 0032\n' + frame)
+            before = set(bpy.data.objects)
+            result = bpy.ops.import_scene.x(directory=directory, files=[{'name': 'first.x'}, {'name': 'second.x'}])
+        self.assertSetEqual(result, {'FINISHED'})
+        meshes = [o.data for o in bpy.data.objects if o not in before and o.type == 'MESH']
+        self.assertEqual(len(meshes), 2)
+        self.assertIsNot(meshes[0], meshes[1])
+
+    def test_frames(self):
+        data = (b'xof 0303txt 0032\n'
+                b'Frame Root {\n FrameTransformMatrix { 1,0,0,0, 0,1,0,0, 0,0,1,0, 1,2,3,1;; }\n'
+                b' Frame Child {\n  FrameTransformMatrix { 1,0,0,0, 0,1,0,0, 0,0,1,0, 0,5,0,1;; }\n'
+                b'  Mesh {\n 3;\n 0;0;0;, 1;0;0;, 0;1;0;;\n 1;\n 3;0,1,2;;\n }\n }\n}\n')
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, 'frames.x')
+            with open(filepath, 'wb') as f:
+                f.write(data)
+            mesh = self.import_meshes(filepath, forward_axis='Y', up_axis='Z')[0]
+        obj = [o for o in bpy.data.objects if o.data is mesh][0]
+        self.assertTrue(obj.users_collection[0].name.startswith('frames'))
+        self.assertEqual(obj.parent.name, 'Child')
+        self.assertEqual(obj.parent.parent.name, 'Root')
+        bpy.context.view_layer.update()
+        self.assertEqual(tuple(obj.matrix_world.translation), (1.0, 7.0, 3.0))
+
 if __name__ == "__main__":
     suite = unittest.defaultTestLoader.loadTestsFromTestCase(ImporterTest)
     runner = unittest.TextTestRunner()
@@ -1,21 +1,62 @@
+import io
+import mmap
 import unittest
-from xfile_parser import XFileParser
+import struct
+import zlib
+import numpy as np
+from xfile_parser import (XFileParser, ParseXFile, ParseXFiles, Node, Scene, RegisterDataObjectHandler,
+                          TOKENIZER_BYTEWISE, TOKENIZER_REGEX)
 
 
 class ParserTest(unittest.TestCase):
 
-    def load(self, filename):
+    def load(self, filename, **kwargs):
         with open(filename, 'br') as f:
             buffer = f.read()
-        parser = XFileParser(buffer)
+        parser = XFileParser(buffer, **kwargs)
         scene = parser.getImportedData()
         return scene
 
+    def compress(self, filename):
+        """ writes a text XFile as a multi-block MSZIP compressed one """
+        with open(filename, 'br') as f:
+            buffer = f.read()
+        data = buffer[buffer.index(b'\n') + 1:]
+        out = [buffer[:8] + b'tzip' + buffer[12:16], struct.pack('<I', len(data) + 16)]
+        previous = b''
+        for start in range(0, len(data), 0x8000):
+            block = data[start:start + 0x8000]
+            if previous:
+                compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=previous)
+            else:
+                compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+            compressed = compressor.compress(block) + compressor.flush()
+            out.append(struct.pack('<HH', len(block), len(compressed) + 2) + b'CK' + compressed)
+            previous = block
+        return b''.join(out)
+
+    def tokens(self, filename, tokenizer):
+        with open(filename, 'br') as f:
+            buffer = f.read()
+        parser = XFileParser(buffer, tokenizer=tokenizer)
+        parser.p = 0
+        parser.lineNumber = 0
+        parser.ReadUntilEndOfLine()
+        tokens = []
+        while True:
+            token = parser.GetNextToken()
+            if not token:
+                break
+            tokens.append(token)
+        return tokens, parser.lineNumber
+
     def test_anim_test(self):
         scene = self.load('models/anim_test.x')
         mesh = scene.rootNode.children[0].children[0].meshes[0]
         self.assertEqual(scene.anims[0].name, "cylinder_test")
         self.assertEqual(len(mesh.positions), 1720)
+        self.assertEqual(scene.animTicksPerSecond, 24)
+        self.assertEqual(scene.anims[0].anims[0].boneName, "pCylinder1")
 
     def test_BCN_Epileptic(self):
         scene = self.load('models/BCN_Epileptic.X')
@@ -68,6 +109,227 @@ class ParserTest(unittest.TestCase):
         self.assertEqual(scene.anims[0].name, "AnimationSet0")
         self.assertEqual(len(mesh.positions), 1479)
 
+    def test_skin_weights(self):
+        scene = self.load('models-nonbsd/dwarf.x')
+        bone = scene.rootNode.children[1].meshes[0].bones[0]
+        self.assertEqual(bone.vertexIndices.dtype, np.int32)
+        self.assertEqual(len(bone.vertexIndices), len(bone.vertexWeights))
+        # compatibility view
+        weights = bone.weights
+        self.assertEqual([w.vertex for w in weights], bone.vertexIndices.tolist())
+        bone.weights = weights[:2]
+        self.assertEqual(len(bone.vertexWeights), 2)
+
+    def test_tokenizer_token_stream(self):
+        for filename in ['models/test.x', 'models/anim_test.x', 'models-nonbsd/dwarf.x']:
+            self.assertEqual(self.tokens(filename, TOKENIZER_REGEX),
+                             self.tokens(filename, TOKENIZER_BYTEWISE))
+
+    def test_tokenizer_same_scene(self):
+        regex = self.load('models/Testwuson.X', tokenizer=TOKENIZER_REGEX)
+        bytewise = self.load('models/Testwuson.X', tokenizer=TOKENIZER_BYTEWISE)
+        regexMesh = regex.rootNode.children[0].meshes[0]
+        bytewiseMesh = bytewise.rootNode.children[0].meshes[0]
+        self.assertTrue(np.array_equal(regexMesh.positions, bytewiseMesh.positions))
+        self.assertTrue(np.array_equal(regexMesh.normals, bytewiseMesh.normals))
+        self.assertTrue(np.array_equal(regexMesh.faceMaterials, bytewiseMesh.faceMaterials))
+
+    def test_bulk_reader_matches_scalar_reader(self):
+        bulk = self.load('models-nonbsd/dwarf.x')
+        scalar = self.load('models-nonbsd/dwarf.x', tokenizer=TOKENIZER_BYTEWISE)
+        bulkMesh = bulk.rootNode.children[1].meshes[0]
+        scalarMesh = scalar.rootNode.children[1].meshes[0]
+        self.assertTrue(np.array_equal(bulkMesh.texCoords, scalarMesh.texCoords))
+        self.assertTrue(np.array_equal(bulkMesh.faceOffsets, scalarMesh.faceOffsets))
+        self.assertTrue(np.array_equal(bulkMesh.faceIndices, scalarMesh.faceIndices))
+        self.assertEqual([(w.vertex, w.weight) for w in bulkMesh.bones[0].weights],
+                         [(w.vertex, w.weight) for w in scalarMesh.bones[0].weights])
+
+    def test_binary_matches_text(self):
+        binary = self.load('models/test_cube_binary.x').rootNode.children[0].meshes[0]
+        text = self.load('models/test_cube_text.x').rootNode.children[0].meshes[0]
+        self.assertTrue(np.allclose(binary.positions, text.positions))
+        self.assertTrue(np.allclose(binary.normals, text.normals))
+        self.assertTrue(np.array_equal(binary.faceIndices, text.faceIndices))
+        self.assertTrue(np.array_equal(binary.faceMaterials, text.faceMaterials))
+
+    def test_multi_block_compressed(self):
+        buffer = self.compress('models/anim_test.x')
+        scene = XFileParser(buffer).getImportedData()
+        text = self.load('models/anim_test.x')
+        mesh = scene.rootNode.children[0].children[0].meshes[0]
+        textMesh = text.rootNode.children[0].children[0].meshes[0]
+        self.assertTrue(np.array_equal(mesh.positions, textMesh.positions))
+        self.assertTrue(np.array_equal(mesh.faceIndices, textMesh.faceIndices))
+        self.assertEqual(len(scene.anims[0].anims), len(text.anims[0].anims))
+
+    def test_parse_sources(self):
+        for filename in ['models/test.x', 'models/fromtruespace_bin32.x']:
+            expected = len(self.load(filename).rootNode.meshes[0].positions)
+            scene = ParseXFile(filename)
+            self.assertEqual(len(scene.rootNode.meshes[0].positions), expected)
+            with open(filename, 'br') as f:
+                scene = ParseXFile(f)
+                self.assertEqual(len(scene.rootNode.meshes[0].positions), expected)
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                scene = ParseXFile(m, tokenizer=TOKENIZER_BYTEWISE)
+                self.assertEqual(len(scene.rootNode.meshes[0].positions), expected)
+                scene = ParseXFile(io.BytesIO(f.read()))
+                self.assertEqual(len(scene.rootNode.meshes[0].positions), expected)
+
+    def test_parse_files(self):
+        filenames = ['models/test.x', 'models/fromtruespace_bin32.x', 'models/missing.x']
+        for maxWorkers in [1, 2]:
+            results = list(ParseXFiles(filenames, maxWorkers))
+            self.assertEqual([filename for filename, _ in results], filenames)
+            for filename, scene in results[:2]:
+                expected = self.load(filename).rootNode.meshes[0]
+                self.assertTrue(np.array_equal(scene.rootNode.meshes[0].positions, expected.positions))
+            self.assertIsInstance(results[2][1], FileNotFoundError)
+
+    def test_lazy(self):
+        with open('models-nonbsd/dwarf.x', 'br') as f:
+            buffer = f.read()
+        parser = XFileParser(buffer, lazy=True)
+        scene = parser.getImportedData()
+        self.assertEqual([e.name for e in parser.FindDataObjects(b'Mesh')], [b'test2Mesh'])
+        self.assertEqual([e.name for e in parser.FindDataObjects(b'AnimationSet')], [b'AnimationSet0'])
+        node = scene.rootNode.children[1]
+        self.assertTrue(Node.meshes.isPending(node))
+        self.assertTrue(Scene.anims.isPending(scene))
+        eager = self.load('models-nonbsd/dwarf.x')
+        self.assertTrue(np.array_equal(node.meshes[0].positions,
+                                       eager.rootNode.children[1].meshes[0].positions))
+        self.assertFalse(Node.meshes.isPending(node))
+        self.assertEqual(scene.anims[0].name, "AnimationSet0")
+        self.assertEqual(len(scene.anims[0].anims), len(eager.anims[0].anims))
+
+    def test_lazy_binary(self):
+        scene = self.load('models/test_cube_binary.x', lazy=True)
+        mesh = scene.rootNode.children[0].meshes[0]
+        self.assertEqual(len(mesh.positions), 24)
+
+    def test_exclude(self):
+        scene = self.load('models-nonbsd/dwarf.x', exclude={'AnimationSet', 'SkinWeights'})
+        mesh = scene.rootNode.children[1].meshes[0]
+        self.assertEqual(scene.anims, [])
+        self.assertEqual(mesh.bones, [])
+        self.assertEqual(len(mesh.positions), 1479)
+        self.assertEqual(len(mesh.normalFaces), len(mesh.posFaces))
+
+    def test_include(self):
+        for filename in ['models/test_cube_text.x', 'models/test_cube_binary.x']:
+            for lazy in [False, True]:
+                # include filters top-level data objects, the nested ones are parsed
+                scene = self.load(filename, lazy=lazy, include=[b'Frame'])
+                mesh = scene.rootNode.children[0].meshes[0]
+                self.assertEqual(len(scene.rootNode.trafoMatrix), 16)
+                self.assertEqual(len(mesh.positions), 24)
+                self.assertEqual(len(mesh.normals), 24)
+                self.assertEqual(len(mesh.materials), 1)
+                scene = self.load(filename, lazy=lazy, include=[b'Frame'],
+                                  exclude=[b'MeshNormals', b'MeshMaterialList'])
+                mesh = scene.rootNode.children[0].meshes[0]
+                self.assertEqual(len(mesh.normals), 0)
+                self.assertEqual(mesh.materials, [])
+                scene = self.load(filename, lazy=lazy, include=[b'Mesh'])
+                self.assertIsNone(scene.rootNode)
+
+    def test_skip_unknown(self):
+        data = (b'xof 0303txt 0032\n'
+                b'Custom {\n 2; "}{"; # }\n Nested { 1.#IND00; }\n // {\n}\n'
+                b'Frame Root {\n FrameTransformMatrix { 1,0,0,0,0,1,0,0,0,0,1,0,0,0,0,1;; }\n}\n')
+        for tokenizer in [TOKENIZER_REGEX, TOKENIZER_BYTEWISE]:
+            scene = XFileParser(data, tokenizer).scene
+            self.assertEqual(scene.rootNode.name, 'Root')
+            self.assertEqual(len(scene.rootNode.trafoMatrix), 16)
+
+    def test_custom_handler(self):
+        def parseUserData(parser, node):
+            parser.ReadHeadOfDataObject()
+            node.userData = parser.GetNextTokenAsString()
+            parser.CheckForClosingBrace()
+        data = (b'xof 0303txt 0032\n'
+                b'Frame Root {\n UserData { "hello"; }\n Frame Child { UserData { "world"; } }\n}\n')
+        self.assertIsNone(RegisterDataObjectHandler('UserData', parseUserData, 'Frame'))
+        try:
+            for lazy in [False, True]:
+                scene = XFileParser(data, lazy=lazy).scene
+                self.assertEqual(scene.rootNode.userData, b'hello')
+                self.assertEqual(scene.rootNode.children[0].userData, b'world')
+        finally:
+            self.assertIs(RegisterDataObjectHandler('UserData', None, 'Frame'), parseUserData)
+        scene = XFileParser(data).scene
+        self.assertFalse(hasattr(scene.rootNode, 'userData'))
+        self.assertEqual(scene.rootNode.children[0].name, 'Child')
+
+    def test_custom_template_binary(self):
+        def name(n):
+            return struct.pack('<HI', 1, len(n)) + n
+        def tokens(*ids):
+            return struct.pack('<%dH' % len(ids), *ids)
+        def numbers(token, fmt, values):
+            return struct.pack('<HI%d%s' % (len(values), fmt), token, len(values), *values)
+        data = (b'xof 0303bin 0032'
+                + tokens(0x1f) + name(b'Light') + tokens(0x0a, 5) + bytes(16)
+                + name(b'ColorRGB') + name(b'color') + tokens(0x14, 0x2a) + name(b'range') + tokens(0x14, 0x29)
+                + name(b'nSamples') + tokens(0x14, 0x34) + name(b'Vector') + name(b'samples')
+                + tokens(0x0e) + name(b'nSamples') + tokens(0x0f, 0x14, 0x34, 0x29) + name(b'flags')
+                + tokens(0x0e) + struct.pack('<HI', 3, 2) + tokens(0x0f, 0x14, 0x0b)
+                + name(b'Light') + name(b'Lamp') + tokens(0x0a)
+                + numbers(7, 'f', [1.0, 0.5, 0.25, 10.0]) + numbers(6, 'I', [2])
+                + numbers(7, 'f', [0, 1, 2, 3, 4, 5]) + numbers(6, 'I', [7, 8]) + tokens(0x0b)
+                + name(b'MeshVertexColors') + tokens(0x0a) + numbers(6, 'I', [1, 3])
+                + numbers(7, 'f', [0.5, 0.5, 0.5, 1.0]) + tokens(0x0b))
+        self.assertEqual(XFileParser(data).scene.dataObjects, [])
+        scene = XFileParser(data, decodeUnknown=True).scene
+        light, colors = scene.dataObjects
+        self.assertEqual((light.templateName, light.name), ('Light', 'Lamp'))
+        self.assertEqual(light.values['color']['green'], 0.5)
+        self.assertEqual(light.values['range'], 10.0)
+        self.assertEqual(light.values['samples'].shape, (2,))
+        self.assertEqual(light.values['samples']['z'].tolist(), [2.0, 5.0])
+        self.assertEqual(light.values['flags'].tolist(), [7, 8])
+        self.assertEqual(colors.values['vertexColors']['index'].tolist(), [3])
+        self.assertEqual(colors.values['vertexColors']['indexColor']['alpha'].tolist(), [1.0])
+        # text files decode the same way
+        scene = self.load('models/kwxport_test_cubewithvcolors.x', decodeUnknown=True)
+        self.assertEqual(scene.dataObjects[0].values['key'], b'Date')
+        self.assertEqual(scene.rootNode.dataObjects[0].values['objectMatrix']['matrix'].shape, (16,))
+        # arrays of variable size templates may be empty
+        data = (b'xof 0303txt 0032\n'
+                b'template Item {\n <11111111-2222-3333-4444-555555555555>\n STRING label;\n}\n'
+                b'template Bag {\n <11111111-2222-3333-4444-555555555556>\n'
+                b' DWORD n;\n array Item items[n];\n DWORD tail;\n}\n'
+                b'Bag B1 {\n 0;;\n 7;;\n}\n'
+                b'Bag B2 {\n 2;\n "a";, "b";;\n 9;;\n}\n')
+        empty, full = XFileParser(data, decodeUnknown=True).scene.dataObjects
+        self.assertEqual(empty.values['items'], [])
+        self.assertEqual(empty.values['tail'], 7)
+        self.assertEqual([item['label'] for item in full.values['items']], [b'a', b'b'])
+        self.assertEqual(full.values['tail'], 9)
+        # templates are declarations, include does not filter them
+        self.assertEqual(len(XFileParser(data, include=[b'Bag'], decodeUnknown=True).scene.dataObjects), 2)
+
+    def test_float_last_digit(self):
+        scene = self.load('models/test.x')
+        mesh = scene.rootNode.meshes[0]
+        self.assertTrue(np.array_equal(mesh.positions[0],
+                                       np.float32([-0.820374, -0.680440, -0.820374])))
+
+    def test_mesh_face_arrays(self):
+        scene = self.load('models/test.x')
+        mesh = scene.rootNode.meshes[0]
+        self.assertEqual(mesh.positions.shape, (24, 3))
+        self.assertEqual(mesh.positions.dtype, np.float32)
+        self.assertEqual(mesh.faceOffsets.dtype, np.int32)
+        self.assertEqual(len(mesh.faceOffsets), 13)
+        # compatibility view
+        self.assertEqual(len(mesh.posFaces), 12)
+        self.assertEqual(list(mesh.posFaces[0].indices), [0, 3, 1])
+        self.assertEqual(list(mesh.posFaces[-1].indices), [21, 23, 22])
+        self.assertEqual(len(mesh.normalFaces), 12)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,364 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+from typing import Iterable, Iterator
+from warnings import warn
+
+import numpy as np
+
+try:
+    from .xfile_parser import (PARSER_VERSION, AnimBone, Animation, Bone, DataObject, Material, Mesh, Node,
+                               Scene, TexEntry, ObjectNames, OpenXFileBuffer, ParseXFile, ParseXFiles)
+except ImportError:
+    from xfile_parser import (PARSER_VERSION, AnimBone, Animation, Bone, DataObject, Material, Mesh, Node,
+                              Scene, TexEntry, ObjectNames, OpenXFileBuffer, ParseXFile, ParseXFiles)
+
+# version of the layout of the cache files
+CACHE_VERSION = 2
+CACHE_SUFFIX = '.npz'
+
+
+def EncodeText(value: str | bytes) -> str | dict:
+    """names are str or bytes, depending on where the parser read them"""
+    if isinstance(value, bytes):
+        return {'bytes': value.decode('latin-1')}
+    return value
+
+
+def DecodeText(value: str | dict) -> str | bytes:
+    if isinstance(value, dict):
+        return value['bytes'].encode('latin-1')
+    return value
+
+
+def EncodeKeys(keys: list[tuple[float, tuple[float, ...]]], size: int) -> np.ndarray:
+    """stores animation keys as rows of the time followed by the values"""
+    return np.array([(time,) + tuple(values) for time, values in keys], np.float64).reshape(-1, size + 1)
+
+
+def DecodeKeys(keys: np.ndarray) -> list[tuple[float, tuple[float, ...]]]:
+    return [(row[0], tuple(row[1:])) for row in keys.tolist()]
+
+
+def SaveScene(scene: Scene, file) -> None:
+    """Writes a scene to a path or file object as .npz archive. The arrays of
+    meshes and animations are stored as they are, everything else as a JSON
+    document in the 'scene' entry."""
+    arrays = {}
+
+    def array(value) -> str:
+        name = 'a%d' % len(arrays)
+        arrays[name] = np.asarray(value)
+        return name
+
+    def material(m: Material) -> dict:
+        return {
+            'name': m.name,
+            'isReference': m.isReference,
+            'diffuse': list(m.diffuse),
+            'specularExponent': m.specularExponent,
+            'specular': list(m.specular),
+            'emissive': list(m.emissive),
+            'textures': [[EncodeText(t.name), t.isNormalMap] for t in m.textures],
+            'sceneIndex': m.sceneIndex,
+        }
+
+    def bone(b: Bone) -> dict:
+        return {
+            'name': EncodeText(b.name),
+            'offsetMatrix': list(b.offsetMatrix),
+            'vertices': array(b.vertexIndices),
+            'weights': array(b.vertexWeights),
+        }
+
+    def value(v: np.ndarray | dict | list):
+        # arrays are stored by the name of their entry
+        if isinstance(v, dict):
+            return {name: value(a) for name, a in v.items()}
+        if isinstance(v, list):
+            return [value(a) for a in v]
+        return array(v)
+
+    def dataObject(o: DataObject) -> dict:
+        return {
+            'templateName': o.templateName,
+            'name': o.name,
+            'values': value(o.values),
+            'references': o.references,
+            'children': [dataObject(c) for c in o.children],
+        }
+
+    def mesh(m: Mesh) -> dict:
+        return {
+            'positions': array(m.positions),
+            'faceOffsets': array(m.faceOffsets),
+            'faceIndices': array(m.faceIndices),
+            'normals': array(m.normals),
+            'normalFaceOffsets': array(m.normalFaceOffsets),
+            'normalFaceIndices': array(m.normalFaceIndices),
+            'numTextures': m.numTextures,
+            'texCoords': array(m.texCoords),
+            'numColorSets': m.numColorSets,
+            'colors': [array(c) for c in m.colors],
+            'faceMaterials': array(m.faceMaterials),
+            'materials': [material(a) for a in m.materials],
+            'bones': [bone(b) for b in m.bones],
+            'dataObjects': [dataObject(o) for o in m.dataObjects],
+        }
+
+    def node(n: Node) -> dict:
+        return {
+            'name': EncodeText(n.name),
+            'trafoMatrix': list(n.trafoMatrix),
+            'meshes': [mesh(m) for m in n.meshes],
+            'children': [node(c) for c in n.children],
+            'dataObjects': [dataObject(o) for o in n.dataObjects],
+        }
+
+    def animation(a: Animation) -> dict:
+        return {
+            'name': EncodeText(a.name),
+            'anims': [{
+                'boneName': EncodeText(b.boneName),
+                'posKeys': array(EncodeKeys(b.posKeys, 3)),
+                'rotKeys': array(EncodeKeys(b.rotKeys, 4)),
+                'scaleKeys': array(EncodeKeys(b.scaleKeys, 3)),
+                'trafoKeys': array(EncodeKeys(b.trafoKeys, 16)),
+            } for b in a.anims],
+        }
+
+    document = {
+        'version': CACHE_VERSION,
+        'rootNode': node(scene.rootNode) if scene.rootNode else None,
+        'globalMeshes': [mesh(m) for m in scene.globalMeshes],
+        'globalMaterials': [material(m) for m in scene.globalMaterials],
+        'anims': [animation(a) for a in scene.anims],
+        'animTicksPerSecond': scene.animTicksPerSecond,
+        'dataObjects': [dataObject(o) for o in scene.dataObjects],
+    }
+    arrays['scene'] = np.frombuffer(json.dumps(document).encode(), np.uint8)
+    np.savez(file, **arrays)
+
+
+def LoadScene(file) -> Scene:
+    """Reads a scene written by SaveScene"""
+    with np.load(file, allow_pickle=False) as data:
+        document = json.loads(data['scene'].tobytes())
+        if document['version'] != CACHE_VERSION:
+            raise ValueError('Unsupported cache version %d' % document['version'])
+
+        def material(d: dict) -> Material:
+            m = Material()
+            m.name = d['name']
+            m.isReference = d['isReference']
+            m.diffuse = tuple(d['diffuse'])
+            m.specularExponent = d['specularExponent']
+            m.specular = tuple(d['specular'])
+            m.emissive = tuple(d['emissive'])
+            m.textures = [TexEntry(DecodeText(name), isNormalMap) for name, isNormalMap in d['textures']]
+            m.sceneIndex = d['sceneIndex']
+            return m
+
+        def bone(d: dict) -> Bone:
+            b = Bone()
+            b.name = DecodeText(d['name'])
+            b.offsetMatrix = tuple(d['offsetMatrix'])
+            b.vertexIndices = data[d['vertices']].astype(np.int32)
+            b.vertexWeights = data[d['weights']].astype(np.float32)
+            return b
+
+        def value(v: str | dict | list) -> np.ndarray | dict | list:
+            if isinstance(v, dict):
+                return {name: value(a) for name, a in v.items()}
+            if isinstance(v, list):
+                return [value(a) for a in v]
+            return data[v]
+
+        def dataObject(d: dict) -> DataObject:
+            o = DataObject()
+            o.templateName = d['templateName']
+            o.name = d['name']
+            o.values = value(d['values'])
+            o.references = d['references']
+            o.children = [dataObject(c) for c in d['children']]
+            return o
+
+        def mesh(d: dict) -> Mesh:
+            m = Mesh()
+            for name in ['positions', 'faceOffsets', 'faceIndices', 'normals', 'normalFaceOffsets',
+                         'normalFaceIndices', 'texCoords', 'faceMaterials']:
+                setattr(m, name, data[d[name]])
+            m.numTextures = d['numTextures']
+            m.numColorSets = d['numColorSets']
+            m.colors = [data[c] for c in d['colors']]
+            m.materials = [material(a) for a in d['materials']]
+            m.bones = [bone(b) for b in d['bones']]
+            m.dataObjects = [dataObject(o) for o in d['dataObjects']]
+            return m
+
+        def node(d: dict, parent: Node | None) -> Node:
+            n = Node(parent)
+            n.name = DecodeText(d['name'])
+            n.trafoMatrix = tuple(d['trafoMatrix'])
+            n.meshes = [mesh(m) for m in d['meshes']]
+            n.children = [node(c, n) for c in d['children']]
+            n.dataObjects = [dataObject(o) for o in d['dataObjects']]
+            return n
+
+        def animation(d: dict) -> Animation:
+            a = Animation()
+            a.name = DecodeText(d['name'])
+            for b in d['anims']:
+                anim = AnimBone()
+                anim.boneName = DecodeText(b['boneName'])
+                anim.posKeys = DecodeKeys(data[b['posKeys']])
+                anim.rotKeys = DecodeKeys(data[b['rotKeys']])
+                anim.scaleKeys = DecodeKeys(data[b['scaleKeys']])
+                anim.trafoKeys = DecodeKeys(data[b['trafoKeys']])
+                a.anims.append(anim)
+            return a
+
+        scene = Scene()
+        scene.rootNode = node(document['rootNode'], None) if document['rootNode'] else None
+        scene.globalMeshes = [mesh(m) for m in document['globalMeshes']]
+        scene.globalMaterials = [material(m) for m in document['globalMaterials']]
+        scene.anims = [animation(a) for a in document['anims']]
+        scene.animTicksPerSecond = document['animTicksPerSecond']
+        scene.dataObjects = [dataObject(o) for o in document['dataObjects']]
+        return scene
+
+
+class XFileCache:
+    """
+    Directory of parsed scenes, keyed by the hash of the file content, the
+    parser version and the data object filters and decoding. The least recently used
+    scenes are removed once the directory grows beyond maxSize bytes.
+    """
+    directory: str
+    maxSize: int
+
+    def __init__(self, directory: str, maxSize: int = 1 << 30):
+        self.directory = directory
+        self.maxSize = maxSize
+
+    def Key(self, buffer, include: Iterable[str | bytes] | None = None,
+            exclude: Iterable[str | bytes] | None = None, decodeUnknown: bool = False) -> str:
+        h = hashlib.blake2b(digest_size=20)
+        h.update(b'%d %d %d\n' % (PARSER_VERSION, CACHE_VERSION, decodeUnknown))
+        for names in [include, exclude]:
+            h.update(b' '.join(sorted(ObjectNames(names))) if names is not None else b'*')
+            h.update(b'\n')
+        h.update(buffer)
+        return h.hexdigest()
+
+    def Path(self, key: str) -> str:
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def Load(self, key: str) -> Scene | None:
+        """returns the cached scene, or None if there is none or it can't be read.
+        Entries which can't be read are removed, the scene is stored again"""
+        path = self.Path(key)
+        try:
+            # closed before a corrupt entry is removed, which Windows refuses for open files
+            with open(path, 'rb') as f:
+                scene = LoadScene(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, EOFError, NotImplementedError,
+                zipfile.BadZipFile, json.JSONDecodeError):
+            # truncated or corrupt entries, e.g. of an interrupted copy of the cache
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            return None
+        try:
+            # the modification time orders the files for eviction
+            os.utime(path)
+        except OSError:
+            pass
+        return scene
+
+    def Store(self, key: str, scene: Scene):
+        """writes a scene to the cache. Failing to do so only warns"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # written to a temporary file first, so readers never see a partial one
+            fd, temp = tempfile.mkstemp(CACHE_SUFFIX, '.', self.directory)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    SaveScene(scene, f)
+                os.replace(temp, self.Path(key))
+            except BaseException:
+                os.unlink(temp)
+                raise
+            self.Evict()
+        except OSError as e:
+            warn('Could not write to the XFile cache: %s' % e)
+
+    def Evict(self):
+        """removes the least recently used scenes until the cache fits in maxSize"""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(CACHE_SUFFIX) and not entry.name.startswith('.'):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.maxSize:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+
+    def Clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(CACHE_SUFFIX):
+                os.unlink(os.path.join(self.directory, name))
+
+    def ParseXFile(self, path: str | os.PathLike, **kwargs) -> Scene:
+        """Parses an XFile like xfile_parser.ParseXFile, reusing the cached scene
+        of the same content if there is one"""
+        kwargs.pop('lazy', None)
+        buffer = OpenXFileBuffer(path)
+        key = self.Key(buffer, kwargs.get('include'), kwargs.get('exclude'), kwargs.get('decodeUnknown', False))
+        scene = self.Load(key)
+        if scene is None:
+            scene = ParseXFile(buffer, **kwargs)
+            self.Store(key, scene)
+        return scene
+
+    def ParseXFiles(self, paths: Iterable[str | os.PathLike], maxWorkers: int | None = None,
+                    **kwargs) -> Iterator[tuple[str | os.PathLike, Scene | Exception]]:
+        """Parses XFiles like xfile_parser.ParseXFiles. Cached scenes are yielded
+        first, the other files are parsed in worker processes and stored"""
+        kwargs.pop('lazy', None)
+        missing = []
+        keys = []
+        for path in paths:
+            try:
+                key = self.Key(OpenXFileBuffer(path), kwargs.get('include'), kwargs.get('exclude'),
+                               kwargs.get('decodeUnknown', False))
+            except OSError as e:
+                yield path, e
+                continue
+            scene = self.Load(key)
+            if scene is None:
+                missing.append(path)
+                keys.append(key)
+            else:
+                yield path, scene
+        for key, (path, scene) in zip(keys, ParseXFiles(missing, maxWorkers, **kwargs)):
+            if not isinstance(scene, Exception):
+                self.Store(key, scene)
+            yield path, scene
@@ -0,0 +1,398 @@
+""" Converts XFiles to NumPy archives and binary glTF without Blender.
+
+    python -m xfile_convert models --output converted
+    python -m xfile_convert scene.x --format glb --workers 8
+
+Directories are searched for .x files recursively and their tree is kept below
+the output directory. Without --output, the converted files are written next
+to the XFiles. The .npz archives hold the whole parsed scene, as the parse
+cache stores it. The .glb files hold the frame hierarchy, the meshes and their
+materials; textures are referenced relative to the .glb file, skinning and
+animations are not converted. Every file is reported with the time of parsing
+it and of writing each format.
+"""
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+from pathlib import PureWindowsPath
+import struct
+import sys
+import time
+from urllib.parse import quote
+import warnings
+
+import numpy as np
+
+try:
+    from .xfile_parser import Material, Mesh, Node, Scene, ParseXFile
+    from .xfile_cache import SaveScene
+except ImportError:
+    from xfile_parser import Material, Mesh, Node, Scene, ParseXFile
+    from xfile_cache import SaveScene
+
+FORMATS = ['npz', 'glb']
+
+GLB_MAGIC = 0x46546C67
+GLB_VERSION = 2
+GLB_CHUNK_JSON = 0x4E4F534A
+GLB_CHUNK_BIN = 0x004E4942
+# component types and buffer view targets of glTF accessors
+COMPONENT_UNSIGNED_INT = 5125
+COMPONENT_FLOAT = 5126
+TARGET_ARRAY_BUFFER = 34962
+TARGET_ELEMENT_ARRAY_BUFFER = 34963
+
+# XFiles are left-handed and glTF is right-handed, both with Y up, so Z is mirrored
+MIRROR_Z = np.diag([1.0, 1.0, -1.0, 1.0])
+
+
+def find_files(paths: list[str]) -> list[tuple[str, str | None]]:
+    """ lists the given files and the .x files below the given directories,
+    each with the directory it was found in, or None for given files
+    """
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append((path, None))
+            continue
+        found = []
+        for directory, _, names in os.walk(path):
+            found += [os.path.join(directory, name) for name in names if name.lower().endswith('.x')]
+        files += [(f, path) for f in sorted(found)]
+    return files
+
+
+def output_paths(path: str, root: str | None, output: str | None, formats: list[str]) -> dict[str, str]:
+    """ returns the path of each format an XFile is converted to """
+    base = os.path.splitext(path)[0]
+    if output:
+        base = os.path.join(output, os.path.relpath(base, root) if root else os.path.basename(base))
+    return {f: base + '.' + f for f in formats}
+
+
+def fan_triangles(offsets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """ triangulates faces given by their offsets into a corner array as fans.
+    Returns the face of every triangle and the corner indices of the triangles
+    as an array of shape (triangles, 3)
+    """
+    counts = np.diff(offsets)
+    triCounts = np.maximum(counts - 2, 0)
+    triFaces = np.repeat(np.arange(len(counts)), triCounts)
+    # k-th triangle of a face uses its corners 0, k+1 and k+2
+    triStarts = np.cumsum(triCounts) - triCounts
+    k = np.arange(len(triFaces)) - triStarts[triFaces]
+    first = offsets[:-1][triFaces]
+    return triFaces, np.stack([first, first + k + 1, first + k + 2], axis=1)
+
+
+def texture_uri(name: bytes, basepath: str, directory: str) -> str | None:
+    """ the URI of a texture file relative to the directory of the glTF file.
+    Like the importer, the texture is looked up relative to the XFile, then
+    next to it, as exporters often write absolute paths. Absolute paths of
+    textures which are not found become file URIs. Returns None for empty names
+    """
+    # same decoding as the importer, MMD appends a sphere map after '*'
+    path = name.decode('shift-jis', errors='replace').split('*')[0]
+    if not path:
+        return None
+    path = path.replace('\\', '/')
+    candidates = [os.path.join(basepath, path), os.path.join(basepath, os.path.basename(path))]
+    found = next((c for c in candidates if os.path.isfile(c)), None)
+    if found is None:
+        if PureWindowsPath(path).is_absolute():
+            return PureWindowsPath(path).as_uri()
+        found = candidates[0]
+    try:
+        return quote(os.path.relpath(found, directory).replace(os.sep, '/'))
+    except ValueError:
+        # on another drive than the glTF file
+        return PureWindowsPath(os.path.abspath(found)).as_uri()
+
+
+class GlbWriter:
+    """
+    Builds the JSON document and the binary buffer of a binary glTF file
+
+    Attributes:
+        document: glTF JSON document
+        chunks: contents of the binary buffer, each padded to four bytes
+        size: length of the binary buffer
+        materials: index of the glTF material of each XFile material by id
+        images: index of the glTF image of each URI
+        basepath: directory of the XFile, texture paths are relative to it
+        directory: directory of the glTF file, image URIs are relative to it
+    """
+    document: dict
+    chunks: list[bytes]
+    size: int
+    materials: dict[int, int]
+    images: dict[str, int]
+    basepath: str
+    directory: str
+
+    def __init__(self, basepath: str = '', directory: str = ''):
+        self.document = {
+            'asset': {'version': '2.0', 'generator': 'Blender-XFileImporter xfile_convert'},
+            'scene': 0,
+            'scenes': [{'nodes': []}],
+        }
+        self.chunks = []
+        self.size = 0
+        self.materials = {}
+        self.images = {}
+        self.basepath = basepath
+        self.directory = directory
+
+    def add(self, key: str, item: dict) -> int:
+        """ appends an item to a top-level array of the document and returns its index """
+        items = self.document.setdefault(key, [])
+        items.append(item)
+        return len(items) - 1
+
+    def accessor(self, values: np.ndarray, type: str, target: int, bounds: bool = False) -> int:
+        """ stores float32 or uint32 values in the binary buffer """
+        values = np.ascontiguousarray(values)
+        data = values.tobytes()
+        view = self.add('bufferViews', {
+            'buffer': 0, 'byteOffset': self.size, 'byteLength': len(data), 'target': target})
+        padding = -len(data) % 4
+        self.chunks += [data, bytes(padding)]
+        self.size += len(data) + padding
+        accessor = {
+            'bufferView': view,
+            'componentType': COMPONENT_FLOAT if values.dtype == np.float32 else COMPONENT_UNSIGNED_INT,
+            'count': len(values),
+            'type': type,
+        }
+        if bounds:
+            accessor['min'] = values.min(axis=0).tolist()
+            accessor['max'] = values.max(axis=0).tolist()
+        return self.add('accessors', accessor)
+
+    def material(self, material: Material) -> int:
+        """ converts a material like the importer does, once per material """
+        if id(material) in self.materials:
+            return self.materials[id(material)]
+        if material.specularExponent > 0:
+            roughness = float(np.sqrt(2 / (material.specularExponent + 2)))
+        else:
+            roughness = 1.0
+        pbr = {
+            'baseColorFactor': [float(c) for c in material.diffuse],
+            'metallicFactor': 0.0,
+            'roughnessFactor': roughness,
+        }
+        textures = [t for t in material.textures if not t.isNormalMap]
+        uri = texture_uri(textures[0].name, self.basepath, self.directory) if textures else None
+        if uri is not None:
+            if uri not in self.images:
+                self.images[uri] = self.add('images', {'uri': uri})
+            pbr['baseColorTexture'] = {'index': self.add('textures', {'source': self.images[uri]})}
+        result = {'name': material.name, 'pbrMetallicRoughness': pbr}
+        if any(material.emissive):
+            result['emissiveFactor'] = [float(c) for c in material.emissive]
+        if material.diffuse[3] < 1.0:
+            result['alphaMode'] = 'BLEND'
+        index = self.materials[id(material)] = self.add('materials', result)
+        return index
+
+    def primitives(self, mesh: Mesh) -> list[dict]:
+        """ converts a mesh into one triangle list per material """
+        positions = mesh.positions
+        corners = mesh.faceIndices
+        if len(corners) == 0:
+            return []
+        if corners.max() >= len(positions):
+            raise ValueError('Face index out of range in mesh')
+
+        # glTF vertices have a single index, so corners with different normals are split
+        normalCorners = None
+        if len(mesh.normals) and len(mesh.normalFaceIndices) == len(corners) \
+                and mesh.normalFaceIndices.max() < len(mesh.normals):
+            normalCorners = mesh.normalFaceIndices
+        elif len(mesh.normals) == len(positions):
+            normalCorners = corners
+        pairs, vertices = np.unique(np.stack([corners, corners if normalCorners is None else normalCorners], 1),
+                                    axis=0, return_inverse=True)
+        vertices = vertices.reshape(-1)
+        vertexPositions = pairs[:, 0]
+
+        attributes = {
+            'POSITION': self.accessor(
+                (positions[vertexPositions] * MIRROR_Z[:3, :3].diagonal()).astype(np.float32),
+                'VEC3', TARGET_ARRAY_BUFFER, True),
+        }
+        if normalCorners is not None:
+            normals = mesh.normals[pairs[:, 1]] * MIRROR_Z[:3, :3].diagonal()
+            lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+            normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+            attributes['NORMAL'] = self.accessor(normals.astype(np.float32), 'VEC3', TARGET_ARRAY_BUFFER)
+        if mesh.numTextures and len(mesh.texCoords) == len(positions):
+            attributes['TEXCOORD_0'] = self.accessor(
+                mesh.texCoords[vertexPositions].astype(np.float32), 'VEC2', TARGET_ARRAY_BUFFER)
+        if mesh.numColorSets and len(mesh.colors[0]) == len(positions):
+            attributes['COLOR_0'] = self.accessor(
+                mesh.colors[0][vertexPositions].astype(np.float32), 'VEC4', TARGET_ARRAY_BUFFER)
+
+        triFaces, triCorners = fan_triangles(mesh.faceOffsets)
+        # mirroring flips the winding of the triangles
+        triangles = vertices[triCorners][:, [0, 2, 1]].astype(np.uint32)
+        numFaces = len(mesh.faceOffsets) - 1
+        if mesh.materials and len(mesh.faceMaterials) == numFaces:
+            triMaterials = mesh.faceMaterials[triFaces]
+        else:
+            triMaterials = np.zeros(len(triFaces), np.int32)
+        order = np.argsort(triMaterials, kind='stable')
+        groups, starts = np.unique(triMaterials[order], return_index=True)
+        primitives = []
+        for group, indices in zip(groups.tolist(), np.split(triangles[order], starts[1:])):
+            primitive = {
+                'attributes': attributes,
+                'indices': self.accessor(indices.reshape(-1), 'SCALAR', TARGET_ELEMENT_ARRAY_BUFFER),
+            }
+            if 0 <= group < len(mesh.materials):
+                primitive['material'] = self.material(mesh.materials[group])
+            primitives.append(primitive)
+        return primitives
+
+    def node(self, name: str, matrix: tuple[float, ...], meshes: list[Mesh]) -> int:
+        """ converts a frame, its meshes are joined into one glTF mesh """
+        node = {'name': name} if name else {}
+        if len(matrix) == 16:
+            # XFile matrices transform row vectors, so their rows are the columns glTF stores
+            m = MIRROR_Z @ np.array(matrix, np.float64).reshape(4, 4) @ MIRROR_Z
+            if not np.array_equal(m, np.identity(4)):
+                node['matrix'] = m.reshape(-1).tolist()
+        primitives = [p for mesh in meshes for p in self.primitives(mesh)]
+        if primitives:
+            node['mesh'] = self.add('meshes', {'primitives': primitives})
+        return self.add('nodes', node)
+
+    def scene(self, scene: Scene):
+        """ converts the frame hierarchy and the meshes outside of frames """
+        roots = self.document['scenes'][0]['nodes']
+        # the children of each frame are known after converting them
+        stack = [(scene.rootNode, None)] if scene.rootNode else []
+        while stack:
+            frame, parent = stack.pop()
+            index = self.node(frame.name, frame.trafoMatrix, frame.meshes)
+            if parent is None:
+                roots.append(index)
+            else:
+                self.document['nodes'][parent].setdefault('children', []).append(index)
+            stack.extend((child, index) for child in reversed(frame.children))
+        for mesh in scene.globalMeshes:
+            roots.append(self.node('', (), [mesh]))
+
+    def write(self, path: str):
+        if self.size:
+            self.document['buffers'] = [{'byteLength': self.size}]
+        document = json.dumps(self.document, separators=(',', ':')).encode()
+        document += b' ' * (-len(document) % 4)
+        chunks = [struct.pack('<II', len(document), GLB_CHUNK_JSON), document]
+        if self.size:
+            chunks += [struct.pack('<II', self.size, GLB_CHUNK_BIN)] + self.chunks
+        length = 12 + sum(len(c) for c in chunks)
+        with open(path, 'wb') as f:
+            f.write(struct.pack('<III', GLB_MAGIC, GLB_VERSION, length))
+            f.writelines(chunks)
+
+
+def resolve_materials(scene: Scene):
+    """ replaces references to materials by the global materials of the same name """
+    references = {m.name: m for m in scene.globalMaterials}
+    meshes = list(scene.globalMeshes)
+    stack = [scene.rootNode] if scene.rootNode else []
+    while stack:
+        node = stack.pop()
+        meshes += node.meshes
+        stack += node.children
+    for mesh in meshes:
+        mesh.materials = [references.get(m.name, m) if m.isReference else m for m in mesh.materials]
+
+
+def write_glb(scene: Scene, path: str, basepath: str = ''):
+    """ writes the frames and meshes of a scene as binary glTF. Texture paths
+    are relative to basepath, the directory of the XFile
+    """
+    resolve_materials(scene)
+    writer = GlbWriter(basepath, os.path.dirname(os.path.abspath(path)))
+    writer.scene(scene)
+    writer.write(path)
+
+
+def convert_file(path: str, outputs: dict[str, str]) -> dict[str, float] | Exception:
+    """ converts an XFile to the output path of each format. Returns the seconds
+    taken by parsing and writing each format, or the exception raised, so that
+    a broken file does not stop the other ones
+    """
+    try:
+        # the parser warns about every data object it does not know
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            start = time.perf_counter()
+            scene = ParseXFile(path)
+            seconds = {'parse': time.perf_counter() - start}
+            for format, output in outputs.items():
+                start = time.perf_counter()
+                os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+                if format == 'npz':
+                    SaveScene(scene, output)
+                else:
+                    write_glb(scene, output, os.path.dirname(path))
+                seconds[format] = time.perf_counter() - start
+        return seconds
+    except Exception as e:
+        return e
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='+', help='XFiles or directories to convert')
+    parser.add_argument('--output', help='directory to write the converted files to')
+    parser.add_argument('--format', choices=FORMATS, nargs='+', default=FORMATS, dest='formats')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='number of processes, 0 uses one per CPU')
+    parser.add_argument('--report', help='write the timings to this JSON file')
+    args = parser.parse_args(argv)
+
+    files = find_files(args.paths)
+    outputs = [output_paths(path, root, args.output, args.formats) for path, root in files]
+    paths = [path for path, _ in files]
+    workers = min(args.workers or os.cpu_count() or 1, len(files))
+    start = time.perf_counter()
+    if workers <= 1:
+        results = map(convert_file, paths, outputs)
+    else:
+        executor = ProcessPoolExecutor(workers)
+        results = executor.map(convert_file, paths, outputs)
+
+    print('%-50s %10s' % ('file', 'parse ms') + ''.join('%10s' % (f + ' ms') for f in args.formats))
+    report = []
+    failed = 0
+    for path, output, result in zip(paths, outputs, results):
+        if isinstance(result, Exception):
+            failed += 1
+            print('%-50s %s: %s' % (path, type(result).__name__, result))
+            report.append({'path': path, 'error': str(result)})
+            continue
+        print('%-50s %10.2f' % (path, result['parse'] * 1000)
+              + ''.join('%10.2f' % (result[f] * 1000) for f in args.formats))
+        report.append({'path': path, 'outputs': output, 'seconds': result})
+    if workers > 1:
+        executor.shutdown()
+    seconds = time.perf_counter() - start
+    print('%d files converted in %.2f s with %d processes, %d failed' %
+          (len(files) - failed, seconds, max(workers, 1), failed))
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'seconds': seconds, 'workers': max(workers, 1), 'files': report}, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
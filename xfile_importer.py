@@ -1,83 +1,131 @@
 from __future__ import annotations
 import bpy
+import hashlib
 import os
-from .xfile_parser import (XFileParser, Mesh, Node)
+from .xfile_parser import (ParseXFile, ParseXFiles, AnimBone, Animation, Material, Mesh, Node, Scene)
+from .xfile_cache import XFileCache, EncodeKeys
 from mathutils import Matrix
-from bpy_extras import node_shader_utils
+from bpy_extras import anim_utils, node_shader_utils
 import numpy as np
 import math
 
+# value of the interpolation of keyframes, XFiles interpolate keys linearly
+INTERPOLATION_LINEAR = 1
 
-def convert_mesh(mesh: Mesh, basepath: str) -> bpy.types.Mesh:
-    # vertex list
-    positions = []
-    normals = []
-    uvs = []
-    materialIndices = []
-    triangleCount = 0
-    for i in range(len(mesh.posFaces)):
-        if len(mesh.posFaces[i].indices) == 3:
-            # triangle
-            indexLine = [0, 1, 2]
-            materialIndices.append(mesh.faceMaterials[i])
-            triangleCount += 1
-        elif len(mesh.posFaces[i].indices) == 4:
-            # Quadrilateral
-            indexLine = [0, 1, 2, 0, 2, 3]
-            materialIndices.append(mesh.faceMaterials[i])
-            materialIndices.append(mesh.faceMaterials[i])
-            triangleCount += 2
+
+def fan_corners(offsets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """ triangulates faces given by their offsets into a corner array as fans.
+    Returns the face of every triangle and the corner indices of the triangles
+    as an array of shape (triangles, 3)
+    """
+    counts = np.diff(offsets)
+    triCounts = counts - 2
+    triFaces = np.repeat(np.arange(len(counts)), triCounts)
+    # k-th triangle of a face uses its corners 0, k+1 and k+2
+    triStarts = np.cumsum(triCounts) - triCounts
+    k = np.arange(len(triFaces)) - triStarts[triFaces]
+    first = offsets[:-1][triFaces]
+    corners = np.stack([first, first + k + 1, first + k + 2], axis=1)
+    return triFaces, corners
+
+
+def find_texture(paths: list[str]) -> str | None:
+    """ returns the first existing file of paths """
+    for path in paths:
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+class TextureResolver:
+    """ loads the images of texture file names. Each file is looked up and
+    loaded once, files which were not found are remembered as well
+    """
+    images: dict[str, bpy.types.Image | None]
+
+    def __init__(self):
+        self.images = {}
+
+    @staticmethod
+    def texture_name(name: bytes) -> str:
+        # TODO: encoding to be provided from import setting
+        tex_name = name.decode('shift-jis', errors='replace')
+        # for MMD, which appends a sphere map after '*'
+        return tex_name.split('*')[0]
+
+    def candidates(self, name: bytes, basepath: str) -> list[str]:
+        """ the path of a texture relative to the XFile, and the file of the same
+        name next to the XFile, as exporters often write absolute paths
+        """
+        tex_name = self.texture_name(name)
+        if os.sep != '\\':
+            tex_name = tex_name.replace('\\', '/')
+        path = os.path.abspath(os.path.join(basepath, tex_name))
+        return [path, os.path.join(os.path.abspath(basepath), os.path.basename(path))]
+
+    def load(self, name: bytes, basepath: str) -> bpy.types.Image | None:
+        if not name:
+            return None
+        paths = self.candidates(name, basepath)
+        key = os.path.normcase(paths[0])
+        if key in self.images:
+            img = self.images[key]
+            try:
+                # images removed since raise ReferenceError
+                if img is None or img.name:
+                    return img
+            except ReferenceError:
+                pass
+        path = find_texture(paths)
+        img = None
+        if path is None:
+            print(f"texture not found: {paths[0]}")
         else:
-            raise ValueError()
-        for j in indexLine:
-            positions.append(mesh.positions[mesh.posFaces[i].indices[j]])
-            normals.append(mesh.normals[mesh.normalFaces[i].indices[j]])
-            if mesh.numTextures > 0:
-                a = mesh.texCoords[mesh.posFaces[i].indices[j]]
-                uvs.append(a)
-
-    indexBufferSource = []
-    for i in range(len(materialIndices)):
-        indexBufferSource.append((i*3+0, i*3+1, i*3+2))
-
-    # generate blender mesh
-    newMesh = bpy.data.meshes.new(mesh.materials[0].name)
-    newMesh.from_pydata(positions, [], indexBufferSource)
-    
-    newMesh.normals_split_custom_set(normals)
-    
-    if uvs:
-        uvl = newMesh.uv_layers.new()
-        uv_data = uvl.data
-        for i in range(len(uv_data)):
-            uv_data[i].uv = uvs[i]
-            uv_data[i].uv[1] = -uv_data[i].uv[1]
+            try:
+                # reuses the image if the file is loaded already
+                img = bpy.data.images.load(filepath=path, check_existing=True)
+            except RuntimeError:
+                print(f"texture can not be loaded: {path}")
+        self.images[key] = img
+        return img
 
-    # load textures
-    image_dic = {}
-    for oldMat in mesh.materials:
-        if oldMat.textures:
-            texEntry = oldMat.textures[0]
-            if not texEntry.name:
-                continue
-            # for MMD
-            tex_name = texEntry.name.decode('shift-jis')
-            tex_name = tex_name.split('*')[0]
-
-            if tex_name in image_dic:
-                continue
-
-            tex_path = os.path.join(basepath, tex_name)
-            img = None
+    def forget_missing(self):
+        """ lets the files which were not found be looked up again """
+        self.images = {key: img for key, img in self.images.items() if img is not None}
+
+
+# shared by the imports of a session if enabled in the add-on preferences
+session_textures = TextureResolver()
+
+
+class MaterialBuilder:
+    """ creates the Blender materials of XFile materials. Materials with the
+    same colors and texture are created once and shared by the meshes
+    """
+    textures: TextureResolver
+    materials: dict[tuple, bpy.types.Material]
+
+    def __init__(self, textures: TextureResolver):
+        self.textures = textures
+        self.materials = {}
+
+    def build(self, oldMat: Material, basepath: str) -> bpy.types.Material:
+        img = self.textures.load(oldMat.textures[0].name, basepath) if oldMat.textures else None
+        key = (tuple(oldMat.diffuse), oldMat.specularExponent, tuple(oldMat.specular),
+               tuple(oldMat.emissive), img.name if img is not None else None)
+        material = self.materials.get(key)
+        if material is not None:
             try:
-                img = bpy.data.images.load(filepath=tex_path)
-            except:
-                print(f"texture not found: {tex_path}")
-            
-            image_dic[tex_name] = img
+                # materials removed since raise ReferenceError
+                material.name
+                return material
+            except ReferenceError:
+                pass
+        material = self.materials[key] = self.create(oldMat, img)
+        return material
 
-    # add material
-    for oldMat in mesh.materials:
+    @staticmethod
+    def create(oldMat: Material, img: bpy.types.Image | None) -> bpy.types.Material:
         temp_material = bpy.data.materials.new(oldMat.name)
         temp_material_wrap = node_shader_utils.PrincipledBSDFWrapper(
             temp_material, is_readonly=False)
@@ -98,69 +146,537 @@ def convert_mesh(mesh: Mesh, basepath: str) -> bpy.types.Mesh:
         else:
             temp_material_wrap.roughness = 1.0
 
-        newMesh.materials.append(temp_material)
-
         # texture
-        if oldMat.textures:
-            texEntry = oldMat.textures[0]
-            tex_name = texEntry.name.decode('shift-jis') # TODO: to be provided from import setting
-            tex_name = tex_name.split('*')[0] # MMD Settings
-            
-            if tex_name in image_dic and image_dic[tex_name] is not None:
-                temp_material_wrap.base_color_texture.image = image_dic[tex_name]
-                temp_material_wrap.base_color_texture.texcoords = "UV"
-
-                if img.channels == 4:
-                    # TODO: Only set transparency if the image file has an alpha channel.
-                    # Get related nodes from the node tree
-                    node_tree = temp_material.node_tree
-                    principled_bsdf_node = temp_material_wrap.node_principled_bsdf
-                    texture_node = temp_material_wrap.base_color_texture.node_image
-
-                    # Link texture alpha to material alpha
-                    node_tree.links.new(principled_bsdf_node.inputs['Alpha'], texture_node.outputs['Alpha'])
-
-    # set material
-    for i in range(len(materialIndices)):
-        newMesh.polygons[i].material_index = materialIndices[i]
+        if img is not None:
+            temp_material_wrap.base_color_texture.image = img
+            temp_material_wrap.base_color_texture.texcoords = "UV"
+
+            if img.channels == 4:
+                # TODO: Only set transparency if the image file has an alpha channel.
+                # Get related nodes from the node tree
+                node_tree = temp_material.node_tree
+                principled_bsdf_node = temp_material_wrap.node_principled_bsdf
+                texture_node = temp_material_wrap.base_color_texture.node_image
+
+                # Link texture alpha to material alpha
+                node_tree.links.new(principled_bsdf_node.inputs['Alpha'], texture_node.outputs['Alpha'])
+        return temp_material
+
+
+def iter_nodes(node: Node | None):
+    """ yields a frame and all frames below it, parents before their children """
+    nodes = [node] if node else []
+    while nodes:
+        node = nodes.pop()
+        yield node
+        nodes.extend(reversed(node.children))
+
+
+def iter_meshes(scene: Scene):
+    """ yields the global meshes and the meshes of all frames """
+    yield from scene.globalMeshes
+    for node in iter_nodes(scene.rootNode):
+        yield from node.meshes
+
+
+def resolve_materials(scene: Scene):
+    """ replaces references to materials in the material lists of meshes by
+    the global materials of the same name
+    """
+    references = {m.name: m for m in scene.globalMaterials}
+    if not references:
+        return
+    for mesh in iter_meshes(scene):
+        mesh.materials = [references.get(m.name, m) if m.isReference else m for m in mesh.materials]
+
+
+def flatten_frames(root: Node | None) -> tuple[list[Node], np.ndarray]:
+    """ lists a frame and all frames below it, parents before their children,
+    with the index of the parent of each frame or -1
+    """
+    nodes = []
+    parents = []
+    stack = [(root, -1)] if root else []
+    while stack:
+        node, parent = stack.pop()
+        parents.append(parent)
+        nodes.append(node)
+        stack.extend((child, len(nodes) - 1) for child in reversed(node.children))
+    return nodes, np.array(parents, np.int64)
+
+
+def frame_matrices(nodes: list[Node], parents: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """ returns the matrices of frames relative to their parent and their world
+    matrices, both of shape (frames, 4, 4). XFiles store matrices for row vectors,
+    Blender uses column vectors. The world matrices of all frames of a tree level
+    are multiplied at once
+    """
+    identity = tuple(np.identity(4).ravel())
+    matrices = np.array([node.trafoMatrix if len(node.trafoMatrix) == 16 else identity for node in nodes],
+                        np.float64).reshape(-1, 4, 4).transpose(0, 2, 1)
+    worlds = matrices.copy()
+    done = parents < 0
+    while not done.all():
+        level = np.flatnonzero(~done & done[parents])
+        worlds[level] = worlds[parents[level]] @ matrices[level]
+        done[level] = True
+    return matrices, worlds
+
+
+def quaternion_multiply(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """ multiplies arrays of quaternions given as w, x, y, z """
+    aw, ax, ay, az = np.moveaxis(a, -1, 0)
+    bw, bx, by, bz = np.moveaxis(b, -1, 0)
+    return np.stack([aw * bw - ax * bx - ay * by - az * bz,
+                     aw * bx + ax * bw + ay * bz - az * by,
+                     aw * by - ax * bz + ay * bw + az * bx,
+                     aw * bz + ax * by - ay * bx + az * bw], axis=-1)
+
+
+def matrix_quaternions(m: np.ndarray) -> np.ndarray:
+    """ converts an array of rotation matrices of shape (n, 3, 3) to quaternions.
+    Each one is computed from the largest of its diagonal and trace, which keeps
+    the division well conditioned
+    """
+    m00, m11, m22 = m[:, 0, 0], m[:, 1, 1], m[:, 2, 2]
+    candidates = np.stack([m00 + m11 + m22, m00, m11, m22], axis=1)
+    case = np.argmax(candidates, axis=1)
+    # 4 * the square of the largest component
+    t = np.where(case == 0, 1 + candidates[:, 0], 1 + 2 * candidates[np.arange(len(m)), case] - candidates[:, 0])
+    r = np.sqrt(np.maximum(t, 1e-12))
+    s = 0.5 / r
+    wx, wy, wz = m[:, 2, 1] - m[:, 1, 2], m[:, 0, 2] - m[:, 2, 0], m[:, 1, 0] - m[:, 0, 1]
+    xy, xz, yz = m[:, 0, 1] + m[:, 1, 0], m[:, 0, 2] + m[:, 2, 0], m[:, 1, 2] + m[:, 2, 1]
+    q = np.choose(case[:, None], [
+        np.stack([0.5 * r, wx * s, wy * s, wz * s], axis=1),
+        np.stack([wx * s, 0.5 * r, xy * s, xz * s], axis=1),
+        np.stack([wy * s, xy * s, 0.5 * r, yz * s], axis=1),
+        np.stack([wz * s, xz * s, yz * s, 0.5 * r], axis=1)])
+    return q
+
+
+def continuous_quaternions(q: np.ndarray) -> np.ndarray:
+    """ flips quaternions to the side of their predecessor, so that interpolating
+    between keys takes the shorter way. The first one gets a positive w
+    """
+    dots = np.einsum('ij,ij->i', q[1:], q[:-1])
+    signs = np.cumprod(np.concatenate([[1.0 if q[0, 0] >= 0 else -1.0], np.where(dots < 0, -1.0, 1.0)]))
+    return q * signs[:, None]
+
+
+def bone_channels(animBone: AnimBone, rest: np.ndarray) -> list[tuple[str, np.ndarray, np.ndarray]]:
+    """ converts the keys of an animated frame into the pose channels of its bone,
+    which are relative to the rest pose of the bone. Returns the data path, times
+    and values of the channels
+    """
+    restRotation = rest[:3, :3]
+    restInverse = matrix_quaternions(restRotation[None]) * [1, -1, -1, -1]
+    positions = EncodeKeys(animBone.posKeys, 3)
+    rotations = EncodeKeys(animBone.rotKeys, 4)
+    # the quaternions of XFiles rotate row vectors
+    rotations[:, 2:] *= -1
+    scales = EncodeKeys(animBone.scaleKeys, 3)
+    if animBone.trafoKeys:
+        keys = EncodeKeys(animBone.trafoKeys, 16)
+        m = keys[:, 1:].reshape(-1, 4, 4).transpose(0, 2, 1)
+        scale = np.linalg.norm(m[:, :3, :3], axis=1)
+        # mirroring matrices get a negative x scale
+        scale[:, 0] *= np.sign(np.linalg.det(m[:, :3, :3]))
+        rotation = matrix_quaternions(m[:, :3, :3] / scale[:, None, :])
+        times = keys[:, :1]
+        positions = np.hstack([times, m[:, :3, 3]])
+        rotations = np.hstack([times, rotation])
+        scales = np.hstack([times, scale])
+
+    channels = []
+    if len(positions):
+        channels.append(('location', positions[:, 0], (positions[:, 1:] - rest[:3, 3]) @ restRotation))
+    if len(rotations):
+        rotation = quaternion_multiply(restInverse, rotations[:, 1:])
+        channels.append(('rotation_quaternion', rotations[:, 0], continuous_quaternions(rotation)))
+    if len(scales):
+        channels.append(('scale', scales[:, 0], scales[:, 1:]))
+    return channels
+
+
+def unique_vertices(mesh: Mesh) -> tuple[np.ndarray, np.ndarray]:
+    """ finds vertices with equal position, texture coordinates and colors.
+    Returns the first vertex of each group, in order of appearance, and the
+    index of the merged vertex for every vertex of the mesh
+    """
+    keys = [mesh.positions]
+    if len(mesh.texCoords) == len(mesh.positions):
+        keys.append(mesh.texCoords)
+    keys += [colors for colors in mesh.colors if len(colors) == len(mesh.positions)]
+    # adding zero turns -0.0 into 0.0, np.unique compares rows bytewise
+    keys = np.hstack(keys) + np.float32(0)
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return first[order], rank[inverse.reshape(-1)]
+
+
+def valid_polygons(offsets: np.ndarray, cornerVertices: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """ finds the faces with at least three corners which do not use a vertex twice.
+    Returns these faces and the indices of their corners
+    """
+    counts = np.diff(offsets)
+    cornerFaces = np.repeat(np.arange(len(counts)), counts)
+    order = np.lexsort((cornerVertices, cornerFaces))
+    v = cornerVertices[order]
+    f = cornerFaces[order]
+    repeated = f[1:][(v[1:] == v[:-1]) & (f[1:] == f[:-1])]
+    valid = counts >= 3
+    valid[repeated] = False
+    return np.flatnonzero(valid), np.flatnonzero(np.repeat(valid, counts))
+
+
+def convert_mesh(mesh: Mesh, basepath: str, merge_vertices: bool = False,
+                 triangulate: bool = False, materials: MaterialBuilder | None = None) -> bpy.types.Mesh:
+    if materials is None:
+        materials = MaterialBuilder(TextureResolver())
+    # the vertices of the XFile are kept, normals and UVs are stored per loop
+    positions = mesh.positions
+    vertexMap = np.arange(len(positions))
+    if merge_vertices:
+        keep, vertexMap = unique_vertices(mesh)
+        positions = positions[keep]
+
+    # faces using a vertex twice crash Blender when setting custom normals
+    polyFaces, loopCorners = valid_polygons(mesh.faceOffsets, vertexMap[mesh.faceIndices])
+    loopTotals = np.diff(mesh.faceOffsets)[polyFaces]
+    if triangulate:
+        offsets = np.zeros(len(loopTotals) + 1, np.int64)
+        np.cumsum(loopTotals, out=offsets[1:])
+        triFaces, triCorners = fan_corners(offsets)
+        polyFaces = polyFaces[triFaces]
+        loopCorners = loopCorners[triCorners.ravel()]
+        loopTotals = np.full(len(triFaces), 3)
+    loopStarts = np.cumsum(loopTotals) - loopTotals
+    cornerVertices = mesh.faceIndices[loopCorners]
+    loopVertices = vertexMap[cornerVertices]
+    numCorners = len(cornerVertices)
+
+    # generate blender mesh. Writing the attribute layers directly is much
+    # faster than foreach_set on the vertices, loops and polygons collections
+    newMesh = bpy.data.meshes.new(mesh.materials[0].name if mesh.materials else 'Mesh')
+    newMesh.vertices.add(len(positions))
+    newMesh.loops.add(numCorners)
+    newMesh.polygons.add(len(polyFaces))
+    newMesh.attributes['position'].data.foreach_set('vector', positions.ravel())
+    newMesh.attributes['.corner_vert'].data.foreach_set('value', loopVertices.astype(np.int32))
+    newMesh.polygons.foreach_set('loop_start', loopStarts.astype(np.int32))
+    # faceMaterials is empty if the material list was excluded from parsing
+    if len(mesh.faceMaterials):
+        materialIndex = newMesh.attributes.new('material_index', 'INT', 'FACE')
+        materialIndex.data.foreach_set('value', mesh.faceMaterials[polyFaces])
+    newMesh.update(calc_edges=True)
+
+    # normals may have been excluded from parsing as well
+    if np.array_equal(np.diff(mesh.normalFaceOffsets), np.diff(mesh.faceOffsets)):
+        loopFaces = np.repeat(polyFaces, loopTotals)
+        normalCorners = loopCorners - mesh.faceOffsets[loopFaces] + mesh.normalFaceOffsets[loopFaces]
+        loopNormals = mesh.normals[mesh.normalFaceIndices[normalCorners]]
+        vertexNormals = np.zeros((len(positions), 3), np.float32)
+        vertexNormals[loopVertices] = loopNormals
+        # rows of float64 convert to Python floats faster than float32 ones
+        if np.array_equal(vertexNormals[loopVertices], loopNormals):
+            newMesh.normals_split_custom_set_from_vertices(vertexNormals.astype(np.float64))
+        else:
+            newMesh.normals_split_custom_set(loopNormals.astype(np.float64))
+
+    if mesh.numTextures > 0 and len(mesh.texCoords):
+        uvs = mesh.texCoords[cornerVertices] * np.array([1, -1], np.float32)
+        uvl = newMesh.uv_layers.new()
+        newMesh.attributes[uvl.name].data.foreach_set('vector', uvs.ravel())
+
+    for oldMat in mesh.materials:
+        newMesh.materials.append(materials.build(oldMat, basepath))
 
     newMesh.update()
 
     return newMesh
 
 
-def convert_node(node: Node, basepath: str, transform: Matrix):
-    if not node:
-        return
-    for mesh in node.meshes:
-        mesh = convert_mesh(mesh, basepath)
-        obj_mesh = bpy.data.objects.new(node.name, mesh)
+def mesh_fingerprint(mesh: Mesh) -> bytes | None:
+    """ hashes the arrays and materials of a mesh, equal meshes share their
+    Blender mesh. Returns None for skinned meshes, as their weights are stored
+    in the Blender mesh as well
+    """
+    if mesh.bones:
+        return None
+    h = hashlib.blake2b(digest_size=20)
+    for array in [mesh.positions, mesh.faceOffsets, mesh.faceIndices, mesh.normals, mesh.normalFaceOffsets,
+                  mesh.normalFaceIndices, mesh.texCoords, mesh.faceMaterials, *mesh.colors]:
+        array = np.ascontiguousarray(array)
+        h.update(b'%s %s\n' % (array.dtype.str.encode(), str(array.shape).encode()))
+        h.update(array.data)
+    h.update(repr((mesh.numTextures, [(m.name, m.diffuse, m.specularExponent, m.specular, m.emissive,
+                                       [t.name for t in m.textures]) for m in mesh.materials])).encode())
+    return h.digest()
+
+
+def shared_mesh(mesh: Mesh, basepath: str, merge_vertices: bool, triangulate: bool,
+                materials: MaterialBuilder | None, meshes: dict[bytes, bpy.types.Mesh] | None) -> bpy.types.Mesh:
+    """ returns the Blender mesh of an equal mesh converted before, or converts it """
+    key = mesh_fingerprint(mesh) if meshes is not None else None
+    if key is not None and key in meshes:
+        try:
+            # meshes removed since raise ReferenceError
+            meshes[key].name
+            return meshes[key]
+        except ReferenceError:
+            pass
+    newMesh = convert_mesh(mesh, basepath, merge_vertices, triangulate, materials)
+    if key is not None:
+        meshes[key] = newMesh
+    return newMesh
+
+
+def convert_armature(nodes: list[Node], parents: np.ndarray, worlds: np.ndarray, name: str,
+                     transform: Matrix, collection: bpy.types.Collection) -> tuple[bpy.types.Object, list[str]]:
+    """ creates an armature with a bone for every frame, in the rest pose of
+    the frames. Returns its object and the names of the bones of the frames
+    """
+    heads = worlds[:, :3, 3]
+    extent = np.ptp(heads, axis=0).max() if len(heads) else 0.0
+    minLength = extent * 0.01 or 0.1
+    # bones reach to their first child, leaves are as long as their parent
+    lengths = np.zeros(len(nodes))
+    for index in range(len(nodes) - 1, 0, -1):
+        distance = np.linalg.norm(heads[index] - heads[parents[index]])
+        if distance > 0:
+            lengths[parents[index]] = distance
+    for index, parent in enumerate(parents.tolist()):
+        if lengths[index] < minLength:
+            lengths[index] = lengths[parent] if parent >= 0 else minLength
+    axes = worlds[:, :3, :3] / np.linalg.norm(worlds[:, :3, :3], axis=1)[:, None, :]
+    matrices = np.concatenate([np.concatenate([axes, heads[:, :, None]], axis=2), worlds[:, 3:]], axis=1)
+
+    armature = bpy.data.armatures.new(name)
+    obj = bpy.data.objects.new(name, armature)
+    obj.matrix_world = transform
+    collection.objects.link(obj)
+    bpy.context.view_layer.objects.active = obj
+    bpy.ops.object.mode_set(mode='EDIT')
+    editBones = []
+    for node, parent, length, matrix in zip(nodes, parents.tolist(), lengths.tolist(), matrices.tolist()):
+        editBone = armature.edit_bones.new(node.name or 'Frame')
+        editBone.head = (0.0, 0.0, 0.0)
+        editBone.tail = (0.0, length, 0.0)
+        editBone.matrix = Matrix(matrix)
+        if parent >= 0:
+            editBone.parent = editBones[parent]
+        editBones.append(editBone)
+    boneNames = [editBone.name for editBone in editBones]
+    bpy.ops.object.mode_set(mode='OBJECT')
+    return obj, boneNames
+
+
+def convert_frames(nodes: list[Node], parents: np.ndarray, matrices: np.ndarray, transform: Matrix,
+                   collection: bpy.types.Collection) -> list[bpy.types.Object]:
+    """ creates an empty for every frame, parented like the frames """
+    empties = [bpy.data.objects.new(node.name or 'Frame', None) for node in nodes]
+    for empty in empties:
+        collection.objects.link(empty)
+    bases = matrices.copy()
+    roots = parents < 0
+    bases[roots] = np.array(transform) @ bases[roots]
+    # the collection holds only the empties yet, matrices are stored by columns
+    collection.objects.foreach_set('matrix_basis', bases.transpose(0, 2, 1).astype(np.float32).ravel())
+    for empty, parent in zip(empties, parents.tolist()):
+        if parent >= 0:
+            empty.parent = empties[parent]
+    return empties
+
+
+def action_fcurve_factory(action: bpy.types.Action, obj: bpy.types.Object):
+    """ returns a function creating the F-curves of an action animating obj.
+    Since Blender 4.4, F-curves belong to a slot of the action
+    """
+    if hasattr(action, 'slots'):
+        slot = action.slots.new(id_type='OBJECT', name=obj.name)
+        channelbag = anim_utils.action_ensure_channelbag_for_slot(action, slot)
+        return lambda data_path, index, group: channelbag.fcurves.new(data_path, index=index, group_name=group)
+    return lambda data_path, index, group: action.fcurves.new(data_path, index=index, action_group=group)
+
+
+def convert_animation(anim: Animation, obj: bpy.types.Object, boneNames: dict[str, str],
+                      frameScale: float) -> bpy.types.Action:
+    """ creates an action of the keys of an animation set. The keyframes of each
+    F-curve are written at once
+    """
+    action = bpy.data.actions.new(anim.name or 'Action')
+    new_fcurve = action_fcurve_factory(action, obj)
+    bones = obj.data.bones
+    for animBone in anim.anims:
+        name = boneNames.get(animBone.boneName)
+        if name is None:
+            continue
+        bone = bones[name]
+        rest = np.array(bone.matrix_local)
+        if bone.parent:
+            rest = np.linalg.inv(np.array(bone.parent.matrix_local)) @ rest
+        dataPath = 'pose.bones["%s"].' % bpy.utils.escape_identifier(name)
+        for channel, times, values in bone_channels(animBone, rest):
+            co = np.empty((len(times), 2), np.float32)
+            co[:, 0] = times * frameScale
+            for index in range(values.shape[1]):
+                fcurve = new_fcurve(dataPath + channel, index, name)
+                co[:, 1] = values[:, index]
+                fcurve.keyframe_points.add(len(co))
+                fcurve.keyframe_points.foreach_set('co', co.ravel())
+                fcurve.keyframe_points.foreach_set('interpolation', np.full(len(co), INTERPOLATION_LINEAR, np.int32))
+                fcurve.update()
+    return action
+
+
+def convert_animations(scene: Scene, obj: bpy.types.Object, boneNames: dict[str, str]):
+    """ creates the actions of the animation sets, the first one is assigned to the armature """
+    render = bpy.context.scene.render
+    # keys are in ticks, without AnimTicksPerSecond in frames
+    frameScale = render.fps / render.fps_base / scene.animTicksPerSecond if scene.animTicksPerSecond > 0 else 1.0
+    actions = [convert_animation(anim, obj, boneNames, frameScale) for anim in scene.anims]
+    for action in actions[1:]:
+        action.use_fake_user = True
+    if actions:
+        obj.animation_data_create()
+        obj.animation_data.action = actions[0]
+
+
+def convert_skin(obj: bpy.types.Object, mesh: Mesh, merge_vertices: bool, armature: bpy.types.Object,
+                 boneNames: dict[str, str]):
+    """ adds a vertex group for every bone of a mesh and deforms it with the armature.
+    The weights of a bone are added with one call per distinct weight
+    """
+    vertexMap = unique_vertices(mesh)[1] if merge_vertices else np.arange(len(mesh.positions))
+    for bone in mesh.bones:
+        group = obj.vertex_groups.new(name=boneNames.get(bone.name, bone.name))
+        valid = (bone.vertexIndices >= 0) & (bone.vertexIndices < len(vertexMap)) & (bone.vertexWeights != 0)
+        # merged vertices keep the weight of their first vertex
+        vertices, first = np.unique(vertexMap[bone.vertexIndices[valid]], return_index=True)
+        weights = bone.vertexWeights[valid][first]
+        values, inverse = np.unique(weights, return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        splits = np.cumsum(np.bincount(inverse, minlength=len(values)))[:-1]
+        for value, indices in zip(values.tolist(), np.split(vertices[order], splits)):
+            group.add(indices.tolist(), value, 'REPLACE')
+    modifier = obj.modifiers.new('Armature', 'ARMATURE')
+    modifier.object = armature
+
+
+def convert_scene(scene: Scene, filepath: str, transform: Matrix, merge_vertices: bool = False,
+                  triangulate: bool = False, materials: MaterialBuilder | None = None,
+                  meshes: dict[bytes, bpy.types.Mesh] | None = None) -> bpy.types.Collection:
+    """ creates the objects of a scene in a new collection named after the file.
+    Frames become empties, or bones of an armature if the scene is animated or
+    skinned. Meshes are parented to their frame
+    """
+    basepath = os.path.dirname(filepath)
+    if materials is None:
+        materials = MaterialBuilder(TextureResolver())
+    if meshes is None:
+        meshes = {}
+    resolve_materials(scene)
+    filename_wo_ext = os.path.splitext(os.path.basename(filepath))[0]
+    collection = bpy.data.collections.new(filename_wo_ext)
+    bpy.context.collection.children.link(collection)
+
+    nodes, parents = flatten_frames(scene.rootNode)
+    matrices, worlds = frame_matrices(nodes, parents)
+    armature = None
+    if nodes and (scene.anims or any(mesh.bones for mesh in iter_meshes(scene))):
+        armature, boneNames = convert_armature(nodes, parents, worlds, filename_wo_ext, transform, collection)
+        # animations and skins refer to frames by name
+        names = {}
+        for node, boneName in zip(nodes, boneNames):
+            names.setdefault(node.name, boneName)
+    else:
+        frames = convert_frames(nodes, parents, matrices, transform, collection)
+
+    objects = []
+    for mesh in scene.globalMeshes:
+        newMesh = shared_mesh(mesh, basepath, merge_vertices, triangulate, materials, meshes)
+        obj_mesh = bpy.data.objects.new(filename_wo_ext, newMesh)
         obj_mesh.matrix_world = transform
-        bpy.context.collection.objects.link(obj_mesh)
-    for child in node.children:
-        convert_node(child, basepath, transform)
+        objects.append((obj_mesh, mesh, -1))
+    for index, node in enumerate(nodes):
+        for mesh in node.meshes:
+            newMesh = shared_mesh(mesh, basepath, merge_vertices, triangulate, materials, meshes)
+            objects.append((bpy.data.objects.new(node.name, newMesh), mesh, index))
+    for obj_mesh, mesh, index in objects:
+        collection.objects.link(obj_mesh)
 
+    for obj_mesh, mesh, index in objects:
+        if armature is None:
+            if index >= 0:
+                obj_mesh.parent = frames[index]
+        elif mesh.bones:
+            # skinned vertices are placed by the offset matrices of the bones
+            obj_mesh.parent = armature
+            obj_mesh.matrix_basis = Matrix.Identity(4)
+            convert_skin(obj_mesh, mesh, merge_vertices, armature, names)
+        elif index >= 0:
+            # children of bones are placed relative to their tail
+            bone = armature.data.bones[boneNames[index]]
+            obj_mesh.parent = armature
+            obj_mesh.parent_type = 'BONE'
+            obj_mesh.parent_bone = bone.name
+            obj_mesh.matrix_parent_inverse = Matrix.Translation((0.0, -bone.length, 0.0))
+            obj_mesh.matrix_basis = bone.matrix_local.inverted() @ Matrix(worlds[index].tolist())
 
-def load(filepath: str, transform: Matrix):
+    if armature is not None:
+        convert_animations(scene, armature, names)
+    return collection
 
+
+def prepare_import():
     if bpy.ops.object.mode_set.poll():
         bpy.ops.object.mode_set(mode='OBJECT')
 
     if bpy.ops.object.select_all.poll():
         bpy.ops.object.select_all(action='DESELECT')
 
-    basepath = os.path.dirname(filepath)
-    filename_wo_ext = os.path.splitext(os.path.basename(filepath))[0]
-    with open(filepath, 'br') as f:
-        buffer = f.read()
-    parser = XFileParser(buffer)
-    oldScene = parser.getImportedData()
-
-    for mesh in oldScene.globalMeshes:
-        mesh = convert_mesh(mesh, basepath)
-        obj_mesh = bpy.data.objects.new(filename_wo_ext, mesh)
-        obj_mesh.matrix_world = transform
-        bpy.context.collection.objects.link(obj_mesh)
-    convert_node(oldScene.rootNode, basepath, transform)
 
-    return
+def load(filepath: str, transform: Matrix, exclude: set[str] = frozenset(), merge_vertices: bool = False,
+         triangulate: bool = False, cache: XFileCache | None = None, textures: TextureResolver | None = None):
+    prepare_import()
+    if textures is None:
+        textures = TextureResolver()
+    materials = MaterialBuilder(textures)
+    meshes = {}
+    if cache:
+        oldScene = cache.ParseXFile(filepath, exclude=exclude)
+    else:
+        oldScene = ParseXFile(filepath, exclude=exclude)
+    convert_scene(oldScene, filepath, transform, merge_vertices, triangulate, materials, meshes)
+
+
+def find_files(directory: str) -> list[str]:
+    """ lists the .x files in a directory """
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.lower().endswith('.x') and os.path.isfile(os.path.join(directory, name)))
+
+
+def load_files(filepaths: list[str], transform: Matrix, exclude: set[str] = frozenset(),
+               merge_vertices: bool = False, triangulate: bool = False,
+               workers: int | None = None, cache: XFileCache | None = None,
+               textures: TextureResolver | None = None) -> list[tuple[str, Exception]]:
+    """ imports many files. They are parsed in worker processes, while the
+    Blender data of the parsed ones is created here.
+    Returns the files which could not be imported with their errors
+    """
+    prepare_import()
+    if textures is None:
+        textures = TextureResolver()
+    materials = MaterialBuilder(textures)
+    failed = []
+    parse = cache.ParseXFiles if cache else ParseXFiles
+    for filepath, oldScene in parse(filepaths, workers, exclude=exclude):
+        if isinstance(oldScene, Exception):
+            failed.append((filepath, oldScene))
+            continue
+        # texture names are relative to each file, so meshes are only shared within it
+        convert_scene(oldScene, filepath, transform, merge_vertices, triangulate, materials)
+    return failed
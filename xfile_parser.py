@@ -1,15 +1,134 @@
 from __future__ import annotations
 
+from concurrent.futures import ProcessPoolExecutor
+import io
+import mmap
+import multiprocessing
+import os
+import re
 import struct
+import sys
+from typing import Callable, Iterable, Iterator
 from warnings import warn
 import zlib
 
+import numpy as np
+import numpy.lib.recfunctions
+
 MSZIP_MAGIC = 0x4B43
 MSZIP_BLOCK = 32786
+# size of the slices of memory maps, which are copied when sliced
+MAP_SLICE = 1 << 20
+
+# increased whenever the parsed scenes change, which invalidates cached ones
+PARSER_VERSION = 4
 
 AI_MAX_NUMBER_OF_TEXTURECOORDS = 2
 AI_MAX_NUMBER_OF_COLOR_SETS = 1
 
+# text tokenizer backends selectable from the XFileParser constructor
+TOKENIZER_REGEX = 'regex'
+TOKENIZER_BYTEWISE = 'bytewise'
+
+# precompiled patterns of the regex tokenizer
+RE_WHITESPACE = re.compile(rb'(?:[ \t\r\n]+|(?://|#)[^\r\n]*)+')
+RE_TOKEN = re.compile(rb'[;{},]|[^\s;{},]+')
+RE_INT = re.compile(rb'(-?[0-9]+)(?:[ \t]*[;,])?')
+RE_FLOAT = re.compile(rb'(-?1\.#IND00|1\.#QNAN0|[-+0-9.eE]+)(?:[ \t]*[;,])?')
+RE_STRING = re.compile(rb'"([^"]*)"(;)?')
+
+# runs of numbers and separators read at once by the bulk array readers
+RE_FLOAT_RUN = re.compile(rb'[-+0-9.eE#INDQAN;, \t\r\n]*')
+RE_INT_RUN = re.compile(rb'[-0-9;, \t\r\n]*')
+RE_SEPARATOR = re.compile(rb'[ \t\r\n]*[;,]')
+SEPARATORS_TO_SPACE = bytes.maketrans(b';,', b'  ')
+
+# braces, strings and comments of a text file, used to index data objects
+RE_BLOCK_DELIMITER = re.compile(rb'[{}"#/]')
+RE_IDENTIFIER = re.compile(rb'[A-Za-z_][\w.\-]*')
+RE_OBJECT_NAME = re.compile(rb'[^\s;,{}"]+')
+TOKEN_SEPARATORS = b' \t\r\n;,{}'
+
+# binary tokens without payload and the text they stand for
+BINARY_TOKENS = {
+    0x0a: b'{', 0x0b: b'}', 0x0c: b'(', 0x0d: b')', 0x0e: b'[', 0x0f: b']',
+    0x10: b'<', 0x11: b'>', 0x12: b'.', 0x13: b',', 0x14: b';',
+    0x1f: b'template',
+    0x28: b'WORD', 0x29: b'DWORD', 0x2a: b'FLOAT', 0x2b: b'DOUBLE', 0x2c: b'CHAR',
+    0x2d: b'UCHAR', 0x2e: b'SWORD', 0x2f: b'SDWORD', 0x30: b'void', 0x31: b'string',
+    0x32: b'unicode', 0x33: b'cstring', 0x34: b'array',
+}
+
+# tokens of template definitions, which the text tokenizer leaves joined, e.g. name[size]
+RE_TEMPLATE_TOKEN = re.compile(rb'<[^>]*>|\.\.\.|[\[\];,]|[^\s\[\];,<>]+')
+
+# data types of template members. FLOAT follows the float size of the file
+PRIMITIVE_TYPES = {
+    b'WORD': '<u2', b'DWORD': '<u4', b'FLOAT': None, b'DOUBLE': '<f8', b'CHAR': 'i1',
+    b'UCHAR': 'u1', b'BYTE': 'u1', b'SWORD': '<i2', b'SDWORD': '<i4',
+}
+STRING_TYPES = frozenset((b'STRING', b'CSTRING', b'UNICODE'))
+
+# the templates DirectX declares for every file
+STANDARD_TEMPLATE_DEFINITIONS = b'''
+template Header { <3D82AB43-62DA-11cf-AB39-0020AF71E433> WORD major; WORD minor; DWORD flags; }
+template Vector { <3D82AB5E-62DA-11cf-AB39-0020AF71E433> FLOAT x; FLOAT y; FLOAT z; }
+template Coords2d { <F6F23F44-7686-11cf-8F52-0040333594A3> FLOAT u; FLOAT v; }
+template Matrix4x4 { <F6F23F45-7686-11cf-8F52-0040333594A3> array FLOAT matrix[16]; }
+template ColorRGBA { <35FF44E0-6C7C-11cf-8F52-0040333594A3> FLOAT red; FLOAT green; FLOAT blue; FLOAT alpha; }
+template ColorRGB { <D3E16E81-7835-11cf-8F52-0040333594A3> FLOAT red; FLOAT green; FLOAT blue; }
+template IndexedColor { <1630B820-7842-11cf-8F52-0040333594A3> DWORD index; ColorRGBA indexColor; }
+template Boolean { <4885AE61-78E8-11cf-8F52-0040333594A3> WORD truefalse; }
+template Boolean2d { <4885AE63-78E8-11cf-8F52-0040333594A3> Boolean u; Boolean v; }
+template MaterialWrap { <4885AE60-78E8-11cf-8F52-0040333594A3> Boolean u; Boolean v; }
+template TextureFilename { <A42790E1-7810-11cf-8F52-0040333594A3> STRING filename; }
+template Material { <3D82AB4D-62DA-11cf-AB39-0020AF71E433> ColorRGBA faceColor; FLOAT power;
+    ColorRGB specularColor; ColorRGB emissiveColor; [...] }
+template MeshFace { <3D82AB5F-62DA-11cf-AB39-0020AF71E433> DWORD nFaceVertexIndices;
+    array DWORD faceVertexIndices[nFaceVertexIndices]; }
+template MeshFaceWraps { <4885AE62-78E8-11cf-8F52-0040333594A3> DWORD nFaceWrapValues;
+    array Boolean2d faceWrapValues[nFaceWrapValues]; }
+template MeshTextureCoords { <F6F23F40-7686-11cf-8F52-0040333594A3> DWORD nTextureCoords;
+    array Coords2d textureCoords[nTextureCoords]; }
+template MeshMaterialList { <F6F23F42-7686-11cf-8F52-0040333594A3> DWORD nMaterials; DWORD nFaceIndexes;
+    array DWORD faceIndexes[nFaceIndexes]; [Material <3D82AB4D-62DA-11cf-AB39-0020AF71E433>] }
+template MeshNormals { <F6F23F43-7686-11cf-8F52-0040333594A3> DWORD nNormals; array Vector normals[nNormals];
+    DWORD nFaceNormals; array MeshFace faceNormals[nFaceNormals]; }
+template MeshVertexColors { <1630B821-7842-11cf-8F52-0040333594A3> DWORD nVertexColors;
+    array IndexedColor vertexColors[nVertexColors]; }
+template Mesh { <3D82AB44-62DA-11cf-AB39-0020AF71E433> DWORD nVertices; array Vector vertices[nVertices];
+    DWORD nFaces; array MeshFace faces[nFaces]; [...] }
+template FrameTransformMatrix { <F6F23F41-7686-11cf-8F52-0040333594A3> Matrix4x4 frameMatrix; }
+template Frame { <3D82AB46-62DA-11cf-AB39-0020AF71E433> [...] }
+template FloatKeys { <10DD46A9-775B-11cf-8F52-0040333594A3> DWORD nValues; array FLOAT values[nValues]; }
+template TimedFloatKeys { <F406B180-7B3B-11cf-8F52-0040333594A3> DWORD time; FloatKeys tfkeys; }
+template AnimationKey { <10DD46A8-775B-11cf-8F52-0040333594A3> DWORD keyType; DWORD nKeys;
+    array TimedFloatKeys keys[nKeys]; }
+template AnimationOptions { <E2BF56C0-840F-11cf-8F52-0040333594A3> DWORD openclosed; DWORD positionquality; }
+template Animation { <3D82AB4F-62DA-11cf-AB39-0020AF71E433> [...] }
+template AnimationSet { <3D82AB50-62DA-11cf-AB39-0020AF71E433> [Animation <3D82AB4F-62DA-11cf-AB39-0020AF71E433>] }
+template AnimTicksPerSecond { <9E415A43-7BA6-4a73-8743-B73D47E88476> DWORD AnimTicksPerSecond; }
+template XSkinMeshHeader { <3CF169CE-FF7C-44ab-93C0-F78F62D172E2> WORD nMaxSkinWeightsPerVertex;
+    WORD nMaxSkinWeightsPerFace; WORD nBones; }
+template VertexDuplicationIndices { <B8D65549-D7C9-4995-89CF-53A9A8B031E3> DWORD nIndices;
+    DWORD nOriginalVertices; array DWORD indices[nIndices]; }
+template SkinWeights { <6F0D123B-BAD2-4167-A0D0-80224F25FABB> STRING transformNodeName; DWORD nWeights;
+    array DWORD vertexIndices[nWeights]; array FLOAT weights[nWeights]; Matrix4x4 matrixOffset; }
+template FVFData { <B6E70A0E-8EF9-4e83-94AD-ECC8B0C04897> DWORD dwFVF; DWORD nDWords; array DWORD data[nDWords]; }
+template VertexElement { <F752461C-1E23-48f6-B9F8-8350850F336F> DWORD Type; DWORD Method; DWORD Usage;
+    DWORD UsageIndex; }
+template DeclData { <BF22E553-292C-4781-9FEA-62BD554BDD93> DWORD nElements;
+    array VertexElement Elements[nElements]; DWORD nDWords; array DWORD data[nDWords]; }
+template EffectFloats { <F1CFE2B3-0DE3-4e28-AFA1-155A750A282D> DWORD nFloats; array FLOAT Floats[nFloats]; }
+template EffectString { <D55B097E-BDB6-4c52-B03D-6051C89D0E42> STRING Value; }
+template EffectDWord { <622C0ED0-956E-4da9-908A-2AF94F3CE716> DWORD Value; }
+template EffectParamFloats { <3014B9A0-62F5-478c-9B86-E4AC9F4E418B> STRING ParamName; DWORD nFloats;
+    array FLOAT Floats[nFloats]; }
+template EffectParamString { <1DBC4C88-94C1-46ee-9076-2C28818C9481> STRING ParamName; STRING Value; }
+template EffectParamDWord { <E13963BC-AE51-4c5d-B00F-CFA3A9D97CE5> STRING ParamName; DWORD Value; }
+template EffectInstance { <E331F7E4-0559-4cc2-8E99-1CEC1657928F> STRING EffectFilename; [...] }
+'''
+
 class Face:
     """
     Helper structure representing a XFile mesh face
@@ -20,6 +139,32 @@ class Face:
         self.indices = []
 
 
+class FaceList:
+    """
+    Read-only sequence of Face objects viewing the face arrays of a mesh
+    """
+    offsets: np.ndarray
+    indices: np.ndarray
+
+    def __init__(self, offsets: np.ndarray, indices: np.ndarray):
+        self.offsets = offsets
+        self.indices = indices
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> Face:
+        if isinstance(index, slice):
+            return [self[a] for a in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError('face index out of range')
+        face = Face()
+        face.indices = self.indices[self.offsets[index]:self.offsets[index+1]]
+        return face
+
+
 class TexEntry:
     """
     Helper structure representing a texture filename inside a material and its potential source
@@ -71,45 +216,124 @@ class BoneWeight:
 class Bone:
     """
     Helper structure to represent a bone in a mesh
+
+    The weights are stored as arrays: vertexWeights[i] is the weight of
+    the vertex vertexIndices[i]. weights gives them as BoneWeight objects.
     """
     name: str
-    weights: list[BoneWeight]
+    vertexIndices: np.ndarray
+    vertexWeights: np.ndarray
     offsetMatrix: tuple[float, ...]
 
     def __init__(self):
         self.name = ''
-        self.weights = []
+        self.vertexIndices = np.zeros(0, np.int32)
+        self.vertexWeights = np.zeros(0, np.float32)
         self.offsetMatrix = ()
 
+    @property
+    def weights(self) -> list[BoneWeight]:
+        weights = []
+        for vertex, value in zip(self.vertexIndices.tolist(), self.vertexWeights.tolist()):
+            weight = BoneWeight()
+            weight.vertex = vertex
+            weight.weight = value
+            weights.append(weight)
+        return weights
+
+    @weights.setter
+    def weights(self, weights: list[BoneWeight]):
+        self.vertexIndices = np.array([w.vertex for w in weights], np.int32)
+        self.vertexWeights = np.array([w.weight for w in weights], np.float32)
+
 
 class Mesh:
     """
     Helper structure to represent an XFile mesh
+
+    Vertex data are NumPy arrays, not lists of tuples. Faces are stored
+    CSR-style: the indices of face i are faceIndices[faceOffsets[i]:faceOffsets[i+1]].
+    posFaces and normalFaces give the same faces as Face objects.
     """
-    positions: list[tuple[float, float, float]]
-    posFaces: list[Face]
-    normals: list[tuple[float, float, float]]
-    normFaces: list[Face]
+    positions: np.ndarray
+    faceOffsets: np.ndarray
+    faceIndices: np.ndarray
+    normals: np.ndarray
+    normalFaceOffsets: np.ndarray
+    normalFaceIndices: np.ndarray
     numTextures: int
-    texCoords: list[list[tuple[float, float]]]
+    texCoords: np.ndarray
     numColorSets: int
-    colors: list[list[tuple[float, float, float, float]]]
-    faceMaterials: list[int]
+    colors: list[np.ndarray]
+    faceMaterials: np.ndarray
     materials: list[Material]
     bones: list[Bone]
+    dataObjects: list[DataObject]
 
     def __init__(self):
-        self.positions = []
-        self.posFaces = []
-        self.normals = []
-        self.normalFaces = []
+        self.positions = np.zeros((0, 3), np.float32)
+        self.faceOffsets = np.zeros(1, np.int32)
+        self.faceIndices = np.zeros(0, np.int32)
+        self.normals = np.zeros((0, 3), np.float32)
+        self.normalFaceOffsets = np.zeros(1, np.int32)
+        self.normalFaceIndices = np.zeros(0, np.int32)
         self.numTextures = 0
-        self.texCoords = [[], []]
+        self.texCoords = np.zeros((0, 2), np.float32)
         self.numColorSets = 0
-        self.colors = [[]]
-        self.faceMaterials = []
+        self.colors = [np.zeros((0, 4), np.float32)]
+        self.faceMaterials = np.zeros(0, np.int32)
         self.materials = []
         self.bones = []
+        self.dataObjects = []
+
+    @property
+    def posFaces(self) -> FaceList:
+        return FaceList(self.faceOffsets, self.faceIndices)
+
+    @posFaces.setter
+    def posFaces(self, faces: list[Face]):
+        self.faceOffsets, self.faceIndices = FaceArrays(faces)
+
+    @property
+    def normalFaces(self) -> FaceList:
+        return FaceList(self.normalFaceOffsets, self.normalFaceIndices)
+
+    @normalFaces.setter
+    def normalFaces(self, faces: list[Face]):
+        self.normalFaceOffsets, self.normalFaceIndices = FaceArrays(faces)
+
+
+class LazyDataObjects:
+    """
+    List attribute whose items may still be unparsed data objects. Deferred
+    items are parsed and appended the first time the attribute is read.
+    """
+
+    def __set_name__(self, owner: type, name: str):
+        self.name = name
+        self.pendingName = '_pending_' + name
+
+    def __get__(self, obj, objtype: type | None = None):
+        if obj is None:
+            return self
+        items = obj.__dict__[self.name]
+        pending = obj.__dict__.get(self.pendingName)
+        if pending:
+            del obj.__dict__[self.pendingName]
+            for loader in pending:
+                items.append(loader())
+        return items
+
+    def __set__(self, obj, value: list):
+        obj.__dict__.pop(self.pendingName, None)
+        obj.__dict__[self.name] = value
+
+    def defer(self, obj, loader: Callable[[], object]):
+        """ adds an item which is parsed by calling loader on first access """
+        obj.__dict__.setdefault(self.pendingName, []).append(loader)
+
+    def isPending(self, obj) -> bool:
+        return bool(obj.__dict__.get(self.pendingName))
 
 
 class Node:
@@ -120,7 +344,8 @@ class Node:
     trafoMatrix: tuple[float, ...]
     parent: Node | None
     children: list[Node]
-    meshes: list[Mesh]
+    meshes: list[Mesh] = LazyDataObjects()
+    dataObjects: list[DataObject]
 
     def __init__(self, parent: Node | None = None):
         self.name = ''
@@ -128,6 +353,7 @@ class Node:
         self.parent = parent
         self.children = []
         self.meshes = []
+        self.dataObjects = []
 
 
 class MatrixKey:
@@ -174,10 +400,11 @@ class Scene:
     Helper structure analogue to aiScene
     """
     rootNode: Node | None
-    globalMeshes: list[Mesh]
-    globalMaterials: list[Material]
-    anims: list[Animation]
+    globalMeshes: list[Mesh] = LazyDataObjects()
+    globalMaterials: list[Material] = LazyDataObjects()
+    anims: list[Animation] = LazyDataObjects()
     animTicksPerSecond: int
+    dataObjects: list[DataObject]
 
     def __init__(self):
         self.rootNode = None
@@ -185,6 +412,333 @@ class Scene:
         self.globalMaterials = []
         self.anims = []
         self.animTicksPerSecond = 0
+        self.dataObjects = []
+
+
+class DataObjectEntry:
+    """
+    Position of a data object in the file, recorded without decoding it
+
+    Attributes:
+        objectType: template name, empty for references like { name }
+        name: object name as far as the index could tell
+        start: offset right behind the template name, where ParseDataObject* continues
+        end: offset behind the closing brace
+        lineNumber: line number at start in text format
+        parent: enclosing data object
+        children: nested data objects
+    """
+    objectType: bytes
+    name: bytes
+    start: int
+    end: int
+    lineNumber: int
+    parent: DataObjectEntry | None
+    children: list[DataObjectEntry]
+
+    def __init__(self, objectType: bytes, name: bytes, start: int, lineNumber: int = 0,
+                 parent: DataObjectEntry | None = None):
+        self.objectType = objectType
+        self.name = name
+        self.start = start
+        self.end = -1
+        self.lineNumber = lineNumber
+        self.parent = parent
+        self.children = []
+
+
+class TemplateMember:
+    """
+    Member of a template
+
+    Attributes:
+        typeName: primitive type like DWORD, or template name
+        name: member name
+        dimensions: array sizes, either numbers or names of previous members
+    """
+    typeName: bytes
+    name: bytes
+    dimensions: list[int | bytes]
+
+    def __init__(self, typeName: bytes, name: bytes):
+        self.typeName = typeName
+        self.name = name
+        self.dimensions = []
+
+
+class Template:
+    """
+    Template definition, declaring the data of the data objects of its name
+
+    Attributes:
+        name: template name
+        guid: GUID without angle brackets, empty in binary files
+        members: data members in file order
+        isOpen: any data object may be nested in the data objects of the template
+        restrictions: template names of the data objects which may be nested otherwise
+    """
+    name: bytes
+    guid: bytes
+    members: list[TemplateMember]
+    isOpen: bool
+    restrictions: list[bytes]
+
+    def __init__(self, name: bytes):
+        self.name = name
+        self.guid = b''
+        self.members = []
+        self.isOpen = False
+        self.restrictions = []
+
+
+class TemplateLayout:
+    """
+    Struct layout of a primitive type or of a template of fixed size
+
+    Attributes:
+        dtype: NumPy dtype, a structured one for templates
+        leaves: primitive dtypes of the values in file order
+        kind: 'f' if all values are floats, 'i' if all are integers, '' if mixed
+    """
+    dtype: np.dtype
+    leaves: list[np.dtype]
+    kind: str
+
+    def __init__(self, dtype: np.dtype):
+        self.dtype = dtype
+        self.leaves = DtypeLeaves(dtype)
+        kinds = set('f' if leaf.kind == 'f' else 'i' for leaf in self.leaves)
+        self.kind = kinds.pop() if len(kinds) == 1 else ''
+
+
+class DataObject:
+    """
+    Data object decoded through its template, e.g. one of a custom template
+
+    Attributes:
+        templateName: template name
+        name: object name, empty if it has none
+        values: member values by name. Numbers, strings and arrays of them or of
+            templates of fixed size are NumPy arrays, the latter of a structured
+            dtype. Members of templates of variable size are dicts of their members,
+            and arrays of them lists of those
+        references: names of the data objects referenced by { name }
+        children: nested data objects
+    """
+    templateName: str
+    name: str
+    values: dict[str, np.ndarray | dict | list]
+    references: list[str]
+    children: list[DataObject]
+
+    def __init__(self):
+        self.templateName = ''
+        self.name = ''
+        self.values = {}
+        self.references = []
+        self.children = []
+
+
+def SplitFaces(values: np.ndarray, numFaces: int) -> tuple[np.ndarray, np.ndarray, int] | None:
+    """Splits faces stored as an index count followed by the indices.
+    Returns the face offsets into the index array, the index array and the
+    number of values used, or None if values holds fewer faces."""
+    if numFaces == 0:
+        return np.zeros(1, np.int64), np.zeros(0, np.int64), 0
+
+    # fast path for meshes made of a single polygon type
+    n = int(values[0]) if len(values) else 0
+    total = numFaces * (n + 1)
+    if n > 0 and len(values) >= total and (values[0:total:n+1] == n).all():
+        indices = values[:total].reshape(numFaces, n + 1)[:, 1:].ravel()
+        offsets = np.arange(0, numFaces * n + 1, n, dtype=np.int64)
+        return offsets, indices, total
+
+    counts = values.tolist()
+    sizes = [0] * numFaces
+    total = 0
+    for a in range(numFaces):
+        if total >= len(counts) or counts[total] < 0:
+            return None
+        sizes[a] = counts[total]
+        total += counts[total] + 1
+    if total > len(counts):
+        return None
+    offsets = np.zeros(numFaces + 1, np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+    mask = np.ones(total, bool)
+    mask[offsets[:-1] + np.arange(numFaces)] = False
+    return offsets, values[:total][mask], total
+
+
+def FaceArrays(faces: list[Face]) -> tuple[np.ndarray, np.ndarray]:
+    """Builds face offsets and a flat index array out of Face objects"""
+    offsets = np.zeros(len(faces) + 1, np.int32)
+    np.cumsum([len(face.indices) for face in faces], out=offsets[1:])
+    indices = np.zeros(offsets[-1], np.int32)
+    for a in range(len(faces)):
+        indices[offsets[a]:offsets[a+1]] = faces[a].indices
+    return offsets, indices
+
+
+def DtypeLeaves(dtype: np.dtype) -> list[np.dtype]:
+    """returns the primitive dtypes of the values of a dtype in file order"""
+    if dtype.subdtype is not None:
+        base, shape = dtype.subdtype
+        return DtypeLeaves(base) * int(np.prod(shape))
+    if dtype.names is None:
+        return [dtype]
+    leaves = []
+    for name in dtype.names:
+        leaves += DtypeLeaves(dtype.fields[name][0])
+    return leaves
+
+
+def CompileTemplate(name: bytes, definition: bytes) -> Template:
+    """Builds a template out of the tokens between the braces of its definition.
+    Raises ValueError if the definition is malformed"""
+    template = Template(name)
+    tokens = RE_TEMPLATE_TOKEN.findall(definition)
+    a = 0
+    try:
+        while a < len(tokens):
+            token = tokens[a]
+            a += 1
+            if token.startswith(b'<'):
+                template.guid = token[1:-1]
+            elif token == b'[':
+                # restrictions, binary files write ... as single dots
+                while tokens[a] != b']':
+                    if tokens[a] == b'...' or tokens[a] == b'.':
+                        template.isOpen = True
+                    elif tokens[a] != b',' and not tokens[a].startswith(b'<'):
+                        template.restrictions.append(tokens[a])
+                    a += 1
+                a += 1
+            elif token != b';':
+                if token == b'array':
+                    token = tokens[a]
+                    a += 1
+                member = TemplateMember(token, tokens[a])
+                a += 1
+                while a < len(tokens) and tokens[a] == b'[':
+                    size = tokens[a + 1]
+                    member.dimensions.append(int(size) if size.isdigit() else size)
+                    if tokens[a + 2] != b']':
+                        raise ValueError('] expected')
+                    a += 3
+                template.members.append(member)
+    except IndexError:
+        raise ValueError('Unexpected end of template %s' % name.decode(errors='replace'))
+    return template
+
+
+def CompileTemplates(definitions: bytes) -> dict[bytes, Template]:
+    """Builds the templates of text template definitions"""
+    return {m.group(1): CompileTemplate(m.group(1), m.group(2))
+            for m in re.finditer(rb'template\s+(\S+)\s*\{([^}]*)\}', definitions)}
+
+
+STANDARD_TEMPLATES = CompileTemplates(STANDARD_TEMPLATE_DEFINITIONS)
+
+
+def ObjectNames(names: Iterable[str | bytes]) -> frozenset[bytes]:
+    """Normalizes template names given as str or bytes"""
+    return frozenset(name.encode() if isinstance(name, str) else name for name in names)
+
+
+def OpenXFileBuffer(source: str | os.PathLike | mmap.mmap | io.RawIOBase | io.BufferedIOBase) -> bytes | mmap.mmap:
+    """Returns a buffer XFileParser can read the given source from.
+
+    Only paths and file objects backed by a regular file are memory mapped
+    read-only, so the file is paged in while it is tokenized instead of being
+    copied into memory first. Other readable streams, e.g. pipes, sockets or
+    io.BytesIO, are read completely into memory, as the parser needs random
+    access to the whole file. To keep memory low, pass a path or a file.
+    """
+    if isinstance(source, (bytes, bytearray, mmap.mmap)):
+        return source
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return OpenXFileBuffer(f)
+    try:
+        return mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        # not a regular file or an empty one
+        return source.read()
+
+
+def ParseXFile(source: str | os.PathLike | mmap.mmap | io.RawIOBase | io.BufferedIOBase, **kwargs) -> Scene:
+    """Parses an XFile from a path, a memory map or a readable stream.
+    Paths and files are memory mapped, other streams are read in full first.
+    Keyword arguments are passed to XFileParser. Its include filters only the
+    top-level data objects, e.g. include={'Frame'} keeps the meshes of frames
+    with their normals and materials, which exclude can still drop.
+
+    Arrays decoded from a memory mapped binary file are views into the map,
+    which is closed once the last of them is released.
+    """
+    parser = XFileParser(OpenXFileBuffer(source), **kwargs)
+    return parser.getImportedData()
+
+
+def ParseXFileTask(path: str, kwargs: dict) -> Scene | Exception:
+    """Parses a file in a worker process of ParseXFiles. Errors are returned, so
+    that a broken file does not stop the other ones"""
+    try:
+        return ParseXFile(path, **kwargs)
+    except Exception as e:
+        return e
+
+
+def ParseXFiles(paths: Iterable[str | os.PathLike], maxWorkers: int | None = None,
+                **kwargs) -> Iterator[tuple[str | os.PathLike, Scene | Exception]]:
+    """Parses many XFiles in a pool of worker processes.
+    Yields each path with its scene, or the exception raised while parsing it,
+    in the order of paths. Keyword arguments are passed to XFileParser, the
+    scenes are always parsed completely, as lazy ones cannot be sent back from
+    the workers.
+
+    Args:
+        maxWorkers: number of processes, None uses the number of CPUs. With a
+            single worker or file the files are parsed in this process
+    """
+    paths = list(paths)
+    kwargs['lazy'] = False
+    if maxWorkers is None:
+        maxWorkers = os.cpu_count() or 1
+    maxWorkers = min(maxWorkers, len(paths))
+    if maxWorkers <= 1:
+        for path in paths:
+            yield path, ParseXFileTask(path, kwargs)
+        return
+
+    initializer = None
+    initargs = ()
+    if __package__:
+        # Workers import this module by its qualified name. Importing the package
+        # itself would run the Blender add-on registration, which needs bpy, so
+        # the package is replaced by a bare module that only provides the path.
+        initializer = exec
+        initargs = ('import sys, types\n'
+                    'package = types.ModuleType(%r)\n'
+                    'package.__path__ = [%r]\n'
+                    'sys.modules.setdefault(package.__name__, package)\n'
+                    % (__package__, os.path.dirname(os.path.abspath(__file__))),)
+    chunksize = max(1, len(paths) // (maxWorkers * 8))
+    # forking would copy the state of the host application, e.g. Blender
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(maxWorkers, context, initializer, initargs) as executor:
+        # spawned processes run the main script again unless it has no file name.
+        # Scripts run by Blender, e.g. with --python, import bpy, which the workers lack
+        main = sys.modules['__main__']
+        mainFile = main.__dict__.pop('__file__', None)
+        try:
+            results = executor.map(ParseXFileTask, paths, [kwargs] * len(paths), chunksize=chunksize)
+        finally:
+            if mainFile is not None:
+                main.__file__ = mainFile
+        yield from zip(paths, results)
 
 
 class XFileParser:
@@ -198,6 +752,13 @@ class XFileParser:
         binaryFloatSize: float size, either 32 or 64 bits
         binaryNumCount: counter for number arrays in binary format
         lineNumber: Line number when reading in text format
+        tokenizer: text tokenizer backend, either TOKENIZER_REGEX or TOKENIZER_BYTEWISE
+        include: template names of top-level data objects to parse, None for all
+        exclude: template names of data objects to skip
+        decodeUnknown: decode data objects without handler through their templates
+        blockIndex: data objects of the file in file order, recorded in lazy mode
+        templates: standard templates and the ones declared in the file by name
+        templateLayouts: compiled layouts of types by name, None for variable sizes
         scene: Imported data
     """
     majorVersion: int
@@ -209,13 +770,40 @@ class XFileParser:
     end: int
     buffer: bytes
     lineNumber: int
+    tokenizer: str
+    include: frozenset[bytes] | None
+    exclude: frozenset[bytes]
+    decodeUnknown: bool
+    blockIndex: list[DataObjectEntry]
+    templates: dict[bytes, Template]
+    templateLayouts: dict[bytes, TemplateLayout | None]
     scene: Scene
 
-    def __init__(self, buffer: bytes):
+    def __init__(self, buffer: bytes | mmap.mmap, tokenizer: str = TOKENIZER_REGEX, lazy: bool = False,
+                 include: Iterable[str | bytes] | None = None, exclude: Iterable[str | bytes] | None = None,
+                 decodeUnknown: bool = False):
         """ Constructor. Creates a data structure out of the XFile given in the memory block. 
         Args:
-            pBuffer: Null-terminated memory buffer containing the XFile
+            pBuffer: Memory buffer or memory map containing the XFile
+            tokenizer: TOKENIZER_REGEX scans text tokens with precompiled patterns,
+                TOKENIZER_BYTEWISE walks the buffer one byte at a time
+            lazy: only index the data objects and build the frame hierarchy. Meshes,
+                materials and animation sets are parsed when the scene attribute
+                holding them is first read
+            include: template names of the top-level data objects to parse, e.g. {'Frame', 'Mesh'}.
+                Other top-level data objects are skipped, the data objects nested in
+                the included ones are parsed unless excluded. None parses all of them
+            exclude: template names of data objects to skip, e.g. {'AnimationSet'}
+            decodeUnknown: decode the data objects without handler, e.g. ones of custom
+                templates, through their templates into the dataObjects lists of the
+                scene, frames and meshes instead of skipping them
         """
+        if tokenizer != TOKENIZER_REGEX and tokenizer != TOKENIZER_BYTEWISE:
+            raise ValueError('Unknown tokenizer %s' % tokenizer)
+        self.tokenizer = tokenizer
+        self.include = ObjectNames(include) if include is not None else None
+        self.exclude = ObjectNames(exclude) if exclude is not None else frozenset()
+        self.decodeUnknown = decodeUnknown
         self.majorVersion = 0
         self.minorVersion = 0
         self.isBinaryFormat = False
@@ -225,6 +813,9 @@ class XFileParser:
         self.end = -1
         self.buffer = buffer
         self.lineNumber = 0
+        self.blockIndex = []
+        self.templates = dict(STANDARD_TEMPLATES)
+        self.templateLayouts = {}
         self.scene = None
 
         # set up memory pointers
@@ -254,7 +845,7 @@ class XFileParser:
             compressed = True
         else:
             self.ThrowException('Unsupported xfile format ' +
-                                self.buffer[8:12].deocde())
+                                self.buffer[8:12].decode())
         # float size
         self.binaryFloatSize = int(self.buffer[12:16])
 
@@ -287,30 +878,60 @@ class XFileParser:
                 p1 += ofs
                 est_out += MSZIP_BLOCK
 
-            # Allocate storage and terminating zero and do the actual uncompressing
-            uncompressedEnd = 0
-            while self.p + 3 < self.end:
-                ofs = struct.unpack_from('H', self.buffer, self.p)[0]
-                self.p += 4
-                if self.p + ofs > self.end + 2:
-                    raise Exception("X: Unexpected EOF in compressed chunk")
-                uncompressed = zlib.decompress(
-                    self.buffer[self.p:], -8, MSZIP_BLOCK)
-                uncompressedEnd += len(uncompressed)
-                self.p += ofs
-            self.buffer = uncompressed
-            self.end = uncompressedEnd
+            # Allocate storage and do the actual uncompressing
+            self.buffer, self.end = self.InflateMSZIP(est_out)
             self.p = 0
         else:
             self.ReadUntilEndOfLine()
 
         self.scene = Scene()
-        self.ParseFile()
+        if lazy:
+            self.ParseFileLazy()
+        else:
+            self.ParseFile()
 
         # filter the imported hierarchy for some degenerated cases
         if self.scene.rootNode:
             self.FilterHierarchy(self.scene.rootNode)
 
+    def InflateMSZIP(self, estimatedSize: int) -> tuple[mmap.mmap | bytes, int]:
+        """ Decompresses the MSZIP blocks following the read position. Each block
+        is a raw deflate stream which may refer back to the output of the previous
+        block, so that output is the preset dictionary of the next block.
+        The blocks are decompressed into an anonymous memory map, which is parsed
+        in place like a mapped file. Its pages beyond the data are never touched.
+        Args:
+            estimatedSize: size to preallocate for the uncompressed data, at least
+                MSZIP_BLOCK per block
+        Returns:
+            the buffer and the end of the uncompressed data in it
+        """
+        if estimatedSize == 0:
+            return b'', 0
+        uncompressed = mmap.mmap(-1, estimatedSize)
+        uncompressedEnd = 0
+        blockStart = 0
+        view = memoryview(self.buffer)
+        while self.p + 3 < self.end:
+            # the block size counts the magic word in front of the deflate stream
+            ofs = struct.unpack_from('H', self.buffer, self.p)[0]
+            self.p += 4
+            if self.p + ofs > self.end + 2:
+                raise Exception("X: Unexpected EOF in compressed chunk")
+            if uncompressedEnd > blockStart:
+                decompressor = zlib.decompressobj(
+                    -15, zdict=uncompressed[blockStart:uncompressedEnd])
+            else:
+                decompressor = zlib.decompressobj(-15)
+            block = decompressor.decompress(
+                view[self.p:self.p + ofs - 2], MSZIP_BLOCK)
+            blockStart = uncompressedEnd
+            uncompressedEnd += len(block)
+            uncompressed[blockStart:uncompressedEnd] = block
+            self.p += ofs
+        view.release()
+        return uncompressed, uncompressedEnd
+
     def __del__(self):
         """ Destructor. Destroys all imported data along with it """
 
@@ -318,47 +939,296 @@ class XFileParser:
         return self.scene
 
     def ParseFile(self):
+        handlers = DATA_OBJECT_HANDLERS[b'']
         running = True
         while(running):
             objectName = self.GetNextToken()
             if not objectName:
                 break
-            if objectName == b'template':
-                self.ParseDataObjectTemplate()
-            elif objectName == b'Frame':
-                self.ParseDataObjectFrame()
-            elif objectName == b'Mesh':
-                mesh = self.ParseDataObjectMesh()
-                self.scene.globalMeshes.append(mesh)
-            elif objectName == b'AnimTicksPerSecond':
-                self.ParseDataObjectAnimTicksPerSecond()
-            elif objectName == b'AnimationSet':
-                self.ParseDataObjectAnimationSet()
-            elif objectName == b'Material':
-                material = self.ParseDataObjectMaterial()
-                self.scene.globalMaterials.append(material)
-            elif objectName == b'}':
+            if objectName == b'}':
                 warn("} found in dataObject")
+            elif self.IsSkipped(objectName, True):
+                self.SkipDataObject()
+            elif objectName in handlers:
+                handlers[objectName](self, self.scene)
+            elif self.IsDecoded(objectName):
+                self.ParseUnknownDataObject(objectName, self.scene.dataObjects)
             else:
                 warn("Unknown data object in animation of .x file")
                 self.ParseUnknownDataObject()
 
+    def ParseFileLazy(self):
+        """ indexes the file and parses only the frame hierarchy. The other
+        top-level data objects are deferred until their scene attribute is read
+        """
+        handlers = DATA_OBJECT_HANDLERS[b'']
+        self.blockIndex = self.BuildBlockIndex()
+        for entry in self.blockIndex:
+            if entry.parent or self.IsSkipped(entry.objectType, True):
+                continue
+            objectName = entry.objectType
+            if objectName == b'Frame':
+                self.ParseFrameEntry(entry)
+            elif objectName == b'Mesh':
+                Scene.globalMeshes.defer(
+                    self.scene, self.DeferDataObject(entry, self.ParseDataObjectMesh))
+            elif objectName == b'AnimationSet':
+                Scene.anims.defer(
+                    self.scene, self.DeferDataObject(entry, self.ParseDataObjectAnimationSet))
+            elif objectName == b'Material':
+                Scene.globalMaterials.defer(
+                    self.scene, self.DeferDataObject(entry, self.ParseDataObjectMaterial))
+            elif objectName in handlers:
+                # other data objects, e.g. AnimTicksPerSecond and templates, are small
+                self.ParseDataObjectAt(entry, lambda: handlers[objectName](self, self.scene))
+            elif self.IsDecoded(objectName):
+                self.ParseDataObjectAt(
+                    entry, lambda: self.ParseUnknownDataObject(objectName, self.scene.dataObjects))
+
+    def ParseFrameEntry(self, entry: DataObjectEntry, parent: Node | None = None):
+        """ builds a frame out of the block index, deferring its meshes """
+        node = Node(parent)
+        node.name = self.ParseDataObjectAt(entry, self.ReadHeadOfDataObject).decode()
+        self.AttachFrame(node, parent)
+        handlers = DATA_OBJECT_HANDLERS[b'Frame']
+        for child in entry.children:
+            objectName = child.objectType
+            if self.IsSkipped(objectName):
+                continue
+            if objectName == b'Frame':
+                self.ParseFrameEntry(child, node)
+            elif objectName == b'Mesh':
+                Node.meshes.defer(
+                    node, self.DeferDataObject(child, self.ParseDataObjectMesh))
+            elif objectName in handlers:
+                self.ParseDataObjectAt(child, lambda: handlers[objectName](self, node))
+            elif self.IsDecoded(objectName):
+                self.ParseDataObjectAt(
+                    child, lambda: self.ParseUnknownDataObject(objectName, node.dataObjects))
+
+    def ParseDataObjectAt(self, entry: DataObjectEntry, parse: Callable[[], object]) -> object:
+        """ moves to an indexed data object and parses it with the given ParseDataObject* method """
+        self.p = entry.start
+        self.binaryNumCount = 0
+        self.lineNumber = entry.lineNumber
+        return parse()
+
+    def DeferDataObject(self, entry: DataObjectEntry, parse: Callable[[], object]) -> Callable[[], object]:
+        return lambda: self.ParseDataObjectAt(entry, parse)
+
+    def FindDataObjects(self, objectType: bytes) -> list[DataObjectEntry]:
+        """ returns the indexed data objects of the given template name """
+        return [entry for entry in self.blockIndex if entry.objectType == objectType]
+
+    def BuildBlockIndex(self) -> list[DataObjectEntry]:
+        """ records the position of every data object following the read position
+        without decoding it. The read position is left unchanged
+        """
+        p = self.p
+        if self.isBinaryFormat:
+            index = self.BuildBlockIndexBinary()
+        else:
+            index = self.BuildBlockIndexText()
+        self.p = p
+        return index
+
+    def BuildBlockIndexText(self) -> list[DataObjectEntry]:
+        index = []
+        stack = []
+        lineNumber = self.lineNumber
+        linePos = self.p
+        pos = self.p
+        while True:
+            # data object headers can't reach back behind the last delimiter
+            last = pos
+            c, start, pos = self.FindNextTextDelimiter(pos)
+            if not c:
+                break
+            if c == b'{':
+                # the template name, optionally followed by the object name
+                headStart = max(last, start - 1024)
+                head = self.buffer[headStart:start].rstrip()
+                objectType, name, typeEnd = self.SplitObjectHead(head)
+                if typeEnd >= 0:
+                    start = headStart + typeEnd
+                lineNumber += self.CountLines(linePos, start)
+                linePos = start
+                entry = DataObjectEntry(
+                    objectType, name, start, lineNumber, stack[-1] if stack else None)
+                if entry.parent:
+                    entry.parent.children.append(entry)
+                index.append(entry)
+                stack.append(entry)
+            elif c == b'}' and stack:
+                stack.pop().end = pos
+        return index
+
+    def FindNextTextDelimiter(self, pos: int) -> tuple[bytes, int, int]:
+        """ finds the next brace or string in a text file, jumping over comments.
+        Returns the delimiter, its start and the offset behind it, which is
+        behind the closing quotation mark for strings. Returns b'' at the end of file
+        """
+        buffer = self.buffer
+        while True:
+            m = RE_BLOCK_DELIMITER.search(buffer, pos, self.end)
+            if not m:
+                return b'', self.end, self.end
+            c = m.group()
+            pos = m.end()
+            if c == b'"':
+                q = buffer.find(b'"', pos, self.end)
+                return c, m.start(), self.end if q < 0 else q + 1
+            elif c == b'#' or c == b'/':
+                # comments start a token, a '#' inside one belongs to e.g. 1.#IND00
+                if c == b'/' and buffer[pos:pos+1] != b'/':
+                    continue
+                if m.start() == 0 or buffer[m.start()-1] in TOKEN_SEPARATORS:
+                    q = buffer.find(b'\n', pos, self.end)
+                    pos = self.end if q < 0 else q
+            else:
+                return c, m.start(), pos
+
+    @staticmethod
+    def SplitObjectHead(head: bytes) -> tuple[bytes, bytes, int]:
+        """ splits the text in front of an opening brace into template name and
+        object name. Returns the end offset of the template name in head, or -1
+        for references without one
+        """
+        parts = head.rsplit(None, 2)
+        if not parts:
+            return b'', b'', -1
+        last = parts[-1]
+        if len(parts) > 1 and RE_IDENTIFIER.fullmatch(parts[-2]) and RE_OBJECT_NAME.fullmatch(last):
+            objectType = parts[-2]
+            nameStart = len(head) - len(last)
+            return objectType, last, head.rfind(objectType, 0, nameStart) + len(objectType)
+        # the template name may directly follow the separators of the preceding data
+        objectType = re.split(rb'[;,]', last)[-1]
+        if not RE_IDENTIFIER.fullmatch(objectType):
+            return b'', b'', -1
+        return objectType, b'', len(head)
+
+    def BuildBlockIndexBinary(self) -> list[DataObjectEntry]:
+        index = []
+        stack = []
+        names = []
+        while True:
+            start = self.p
+            tok = self.NextBinToken()
+            if tok == 0:
+                break
+            if tok == 1:
+                names.append((self.buffer[start+6:self.p], self.p))
+                continue
+            if tok == 0x1f:
+                names.append((b'template', self.p))
+                continue
+            if tok == 0x0a:
+                objectType = b''
+                name = b''
+                objectStart = start
+                if names:
+                    objectType, objectStart = names[-1]
+                    if len(names) > 1:
+                        name = objectType
+                        objectType, objectStart = names[-2]
+                entry = DataObjectEntry(
+                    objectType, name, objectStart, 0, stack[-1] if stack else None)
+                if entry.parent:
+                    entry.parent.children.append(entry)
+                index.append(entry)
+                stack.append(entry)
+            elif tok == 0x0b and stack:
+                stack.pop().end = self.p
+            names.clear()
+        return index
+
+    def NextBinToken(self) -> int:
+        """ reads a binary token id and moves past its payload. Returns 0 at the end of file """
+        if self.end-self.p < 2:
+            self.p = self.end
+            return 0
+        tok = self.ReadBinWord()
+        if tok == 1 or tok == 2:
+            if self.end-self.p < 4:
+                self.p = self.end
+                return 0
+            l = self.ReadBinDWord()
+            # strings are followed by a terminating token
+            self.p += l if tok == 1 else l + 2
+        elif tok == 3:
+            self.p += 4
+        elif tok == 5:
+            self.p += 16
+        elif tok == 6 or tok == 7:
+            if self.end-self.p < 4:
+                self.p = self.end
+                return 0
+            l = self.ReadBinDWord()
+            self.p += l * (4 if tok == 6 else self.binaryFloatSize // 8)
+        if self.p > self.end:
+            self.p = self.end
+        return tok
+
+    def CountLines(self, start: int, end: int) -> int:
+        if isinstance(self.buffer, bytes):
+            return self.buffer.count(b'\n', start, end)
+        # memory maps have no count, so they are counted slice by slice
+        return sum(self.buffer[p:min(p + MAP_SLICE, end)].count(b'\n') for p in range(start, end, MAP_SLICE))
+
     def ParseDataObjectTemplate(self):
+        """ reads a template definition and adds it to the templates of the file """
         name = self.ReadHeadOfDataObject()
-        guid = self.GetNextToken()
+        tokens = []
         running = True
         while(running):
-            s = self.GetNextToken()
+            if (self.isBinaryFormat and self.end-self.p >= 6
+                    and struct.unpack_from('<H', self.buffer, self.p)[0] == 0x03):
+                # array sizes, which GetNextToken skips
+                self.p += 2
+                s = str(self.ReadBinDWord()).encode()
+            else:
+                s = self.GetNextToken()
             if (s == b'}'):
                 break
             if not s:
                 self.ThrowException(
                     "Unexpected end of file reached while parsing template definition")
+            tokens.append(s)
+        try:
+            self.templates[name] = CompileTemplate(name, b' '.join(tokens))
+            # layouts may refer to a template of the same name declared before
+            self.templateLayouts.clear()
+        except ValueError as e:
+            warn("Invalid template definition in x file: %s" % e)
 
     def ParseDataObjectFrame(self, parent: Node | None = None):
         name = self.ReadHeadOfDataObject()
         node = Node(parent)
         node.name = name.decode()
+        self.AttachFrame(node, parent)
+
+        handlers = DATA_OBJECT_HANDLERS[b'Frame']
+        running = True
+        while running:
+            objectName = self.GetNextToken()
+            if not objectName:
+                self.ThrowException(
+                    "Unexpected end of file reached while parsing frame")
+            if objectName == b'}':
+                break
+            elif self.IsSkipped(objectName):
+                self.SkipDataObject()
+            elif objectName in handlers:
+                handlers[objectName](self, node)
+            elif self.IsDecoded(objectName):
+                self.ParseUnknownDataObject(objectName, node.dataObjects)
+            else:
+                warn("Unknown data object in frame in x file")
+                self.ParseUnknownDataObject()
+
+    def AttachFrame(self, node: Node, parent: Node | None):
+        """ adds a frame to its parent, or to the root of the scene for top-level frames """
         if parent:
             parent.children.append(node)
         else:
@@ -373,52 +1243,18 @@ class XFileParser:
             else:
                 self.scene.rootNode = node
 
-        running = True
-        while running:
-            objectName = self.GetNextToken()
-            if not objectName:
-                self.ThrowException(
-                    "Unexpected end of file reached while parsing frame")
-            if objectName == b'}':
-                break
-            elif objectName == b'Frame':
-                self.ParseDataObjectFrame(node)
-            elif objectName == b'FrameTransformMatrix':
-                node.trafoMatrix = self.ParseDataObjectTransformationMatrix()
-            elif objectName == b'Mesh':
-                mesh = self.ParseDataObjectMesh()
-                node.meshes.append(mesh)
-            else:
-                warn("Unknown data object in frame in x file")
-                self.ParseUnknownDataObject()
-
     def ParseDataObjectTransformationMatrix(self) -> tuple[float, ...]:
         # read header, we're not interested if it has a name
         self.ReadHeadOfDataObject()
 
         # read its components
-        M11 = self.ReadFloat()
-        M21 = self.ReadFloat()
-        M31 = self.ReadFloat()
-        M41 = self.ReadFloat()
-        M12 = self.ReadFloat()
-        M22 = self.ReadFloat()
-        M32 = self.ReadFloat()
-        M42 = self.ReadFloat()
-        M13 = self.ReadFloat()
-        M23 = self.ReadFloat()
-        M33 = self.ReadFloat()
-        M43 = self.ReadFloat()
-        M14 = self.ReadFloat()
-        M24 = self.ReadFloat()
-        M34 = self.ReadFloat()
-        M44 = self.ReadFloat()
+        matrix = tuple(self.ReadFloatArray(16).tolist())
 
         # trailing symbols
         self.CheckForSemicolon()
         self.CheckForClosingBrace()
 
-        return (M11, M21, M31, M41, M12, M22, M32, M42, M13, M23, M33, M43, M14, M24, M34, M44)
+        return matrix
 
     def ParseDataObjectMesh(self) -> Mesh:
         mesh = Mesh()
@@ -428,26 +1264,22 @@ class XFileParser:
         numVertices = self.ReadInt()
 
         # read vertices
-        for a in range(numVertices):
-            mesh.positions.append(self.ReadVector3())
+        positions = self.ReadFloatArray(numVertices * 3, 3)
+        mesh.positions = positions.astype(np.float32, copy=False).reshape(-1, 3)
 
         # read position faces
         numPosFaces = self.ReadInt()
-        mesh.posFaces = []
-        for a in range(numPosFaces):
-            numIndices = self.ReadInt()
-            if numIndices < 3:
-                self.ThrowException(
-                    "Invalid index count %1% for face %2%.".format(numIndices, a))
-            # read indices
-            face = Face()
-            face.indices = []
-            for b in range(numIndices):
-                face.indices.append(self.ReadInt())
-            mesh.posFaces.append(face)
-            self.TestForSeparator()
+        offsets, indices = self.ReadFaceArray(numPosFaces)
+        sizes = np.diff(offsets)
+        if numPosFaces > 0 and sizes.min() < 3:
+            a = int(np.argmax(sizes < 3))
+            self.ThrowException(
+                "Invalid index count %d for face %d." % (sizes[a], a))
+        mesh.faceOffsets = offsets.astype(np.int32)
+        mesh.faceIndices = indices.astype(np.int32)
 
         # here, other data objects may follow
+        handlers = DATA_OBJECT_HANDLERS[b'Mesh']
         running = True
         while running:
             objectName = self.GetNextToken()
@@ -457,22 +1289,14 @@ class XFileParser:
                     "Unexpected end of file while parsing mesh structure")
             elif objectName == b'}':
                 break  # mesh finished
-            elif objectName == b'MeshNormals':
-                self.ParseDataObjectMeshNormals(mesh)
-            elif objectName == b'MeshTextureCoords':
-                self.ParseDataObjectMeshTextureCoords(mesh)
-            elif objectName == b'MeshVertexColors':
-                self.ParseDataObjectMeshVertexColors(mesh)
-            elif objectName == b'MeshMaterialList':
-                self.ParseDataObjectMeshMaterialList(mesh)
-            elif objectName == b'VertexDuplicationIndices':
-                self.ParseUnknownDataObject()  # we'll ignore vertex duplication indices
-            elif objectName == b'XSkinMeshHeader':
-                self.ParseDataObjectSkinMeshHeader(mesh)
-            elif objectName == b'SkinWeights':
-                self.ParseDataObjectSkinWeights(mesh)
+            elif self.IsSkipped(objectName):
+                self.SkipDataObject()
+            elif objectName in handlers:
+                handlers[objectName](self, mesh)
+            elif self.IsDecoded(objectName):
+                self.ParseUnknownDataObject(objectName, mesh.dataObjects)
             else:
-                print("Unknown data object in mesh in x file")
+                warn("Unknown data object in mesh in x file")
                 self.ParseUnknownDataObject()
 
         return mesh
@@ -491,36 +1315,11 @@ class XFileParser:
 
         # read vertex weights
         numWeights = self.ReadInt()
-        bone.weights = []
-
-        for a in range(0, numWeights):
-            weight = BoneWeight()
-            weight.vertex = self.ReadInt()
-            bone.weights.append(weight)
-
-        # read vertex weights
-        for a in range(0, numWeights):
-            bone.weights[a].weight = self.ReadFloat()
+        bone.vertexIndices = self.ReadIntArray(numWeights).astype(np.int32)
+        bone.vertexWeights = self.ReadFloatArray(numWeights).astype(np.float32)
 
         # read matrix offset
-        a1 = self.ReadFloat()
-        b1 = self.ReadFloat()
-        c1 = self.ReadFloat()
-        d1 = self.ReadFloat()
-        a2 = self.ReadFloat()
-        b2 = self.ReadFloat()
-        c2 = self.ReadFloat()
-        d2 = self.ReadFloat()
-        a3 = self.ReadFloat()
-        b3 = self.ReadFloat()
-        c3 = self.ReadFloat()
-        d3 = self.ReadFloat()
-        a4 = self.ReadFloat()
-        b4 = self.ReadFloat()
-        c4 = self.ReadFloat()
-        d4 = self.ReadFloat()
-        bone.offsetMatrix = (a1, b1, c1, d1, a2, b2, c2,
-                             d2, a3, b3, c3, d3, a4, b4, c4, d4)
+        bone.offsetMatrix = tuple(self.ReadFloatArray(16).tolist())
 
         self.CheckForSemicolon()
         self.CheckForClosingBrace()
@@ -541,23 +1340,18 @@ class XFileParser:
         numNormals = self.ReadInt()
 
         # read normal vectors
-        for a in range(numNormals):
-            mesh.normals.append(self.ReadVector3())
+        normals = self.ReadFloatArray(numNormals * 3, 3)
+        mesh.normals = normals.astype(np.float32, copy=False).reshape(-1, 3)
 
         # read normal indices
         numFaces = self.ReadInt()
-        if numFaces != len(mesh.posFaces):
+        if numFaces != len(mesh.faceOffsets) - 1:
             self.ThrowException(
                 "Normal face count does not match vertex face count.")
 
-        for a in range(0, numFaces):
-            numIndices = self.ReadInt()
-            face = Face()
-            face.indices = []
-            for b in range(0, numIndices):
-                face.indices.append(self.ReadInt())
-            mesh.normalFaces.append(face)
-            self.TestForSeparator()
+        offsets, indices = self.ReadFaceArray(numFaces)
+        mesh.normalFaceOffsets = offsets.astype(np.int32)
+        mesh.normalFaceIndices = indices.astype(np.int32)
 
         self.CheckForClosingBrace()
 
@@ -571,11 +1365,8 @@ class XFileParser:
             self.ThrowException(
                 "Texture coord count does not match vertex count")
 
-        coords = [0]*numCoords
-        for a in range(numCoords):
-            coords[a] = self.ReadVector2()
-
-        mesh.texCoords = coords
+        coords = self.ReadFloatArray(numCoords * 2, 2)
+        mesh.texCoords = coords.astype(np.float32, copy=False).reshape(-1, 2)
         mesh.numTextures += 1
 
         self.CheckForClosingBrace()
@@ -584,15 +1375,15 @@ class XFileParser:
         self.ReadHeadOfDataObject()
         if mesh.numColorSets+1 > AI_MAX_NUMBER_OF_COLOR_SETS:
             self.ThrowException("Too many colorsets")
-        colors = mesh.colors[mesh.numColorSets]
-        mesh.numColorSets += 1
-
         numColors = self.ReadInt()
         if numColors != len(mesh.positions):
             self.ThrowException(
                 "Vertex color count does not match vertex count")
 
-        colors.extend([(0.0, 0.0, 0.0, 1.0)]*numColors)
+        colors = np.zeros((numColors, 4), np.float32)
+        colors[:, 3] = 1.0
+        mesh.colors[mesh.numColorSets] = colors
+        mesh.numColorSets += 1
         for a in range(numColors):
             index = self.ReadInt()
             if index >= len(mesh.positions):
@@ -616,13 +1407,13 @@ class XFileParser:
         # read non triangulated face material index count
         numMatIndices = self.ReadInt()
 
-        if numMatIndices != len(mesh.posFaces) and numMatIndices != 1:
+        numFaces = len(mesh.faceOffsets) - 1
+        if numMatIndices != numFaces and numMatIndices != 1:
             self.ThrowException(
                 "Per-Face material index count does not match face count.")
 
         # read per-face material indices
-        for a in range(numMatIndices):
-            mesh.faceMaterials.append(self.ReadInt())
+        faceMaterials = self.ReadIntArray(numMatIndices).astype(np.int32)
 
         # in version 03.02, the face indices end with two semicolons.
         # commented out version check, as version 03.03 exported from blender also has 2 semicolons
@@ -631,10 +1422,12 @@ class XFileParser:
                 self.p += 1
 
         # if there was only a single material index, replicate it on all faces
-        while len(mesh.faceMaterials) < len(mesh.posFaces):
-            mesh.faceMaterials.append(mesh.faceMaterials[0])
+        if len(faceMaterials) < numFaces:
+            faceMaterials = np.full(numFaces, faceMaterials[0], np.int32)
+        mesh.faceMaterials = faceMaterials
 
         # read following data objects
+        handlers = DATA_OBJECT_HANDLERS[b'MeshMaterialList']
         running = True
         while running:
             objectName = self.GetNextToken()
@@ -651,12 +1444,13 @@ class XFileParser:
                 mesh.materials.append(material)
 
                 self.CheckForClosingBrace()
-            elif objectName == b'Material':
-                material = self.ParseDataObjectMaterial()
-                mesh.materials.append(material)
             elif objectName == b';':
                 pass
                 # ignore
+            elif self.IsSkipped(objectName):
+                self.SkipDataObject()
+            elif objectName in handlers:
+                handlers[objectName](self, mesh)
             else:
                 warn("Unknown data object in material list in x file")
                 self.ParseUnknownDataObject()
@@ -677,6 +1471,7 @@ class XFileParser:
         material.emissive = self.ReadRGB()
 
         # read other data objects
+        handlers = DATA_OBJECT_HANDLERS[b'Material']
         running = True
         while running:
             objectName = self.GetNextToken()
@@ -685,14 +1480,10 @@ class XFileParser:
                     "Unexpected end of file while parsing mesh material")
             elif objectName == b'}':
                 break  # material finished
-            elif objectName == b'TextureFilename' or objectName == b'TextureFileName':
-                # some exporters write "TextureFileName" instead.
-                texname = self.ParseDataObjectTextureFilename()
-                material.textures.append(TexEntry(texname))
-            elif objectName == b'NormalmapFilename' or objectName == b'NormalmapFileName':
-                # one exporter writes out the normal map in a separate filename tag
-                texname = self.ParseDataObjectTextureFilename()
-                material.textures.append(TexEntry(texname, True))
+            elif self.IsSkipped(objectName):
+                self.SkipDataObject()
+            elif objectName in handlers:
+                handlers[objectName](self, material)
             else:
                 warn("Unknown data object in material in x file")
                 self.ParseUnknownDataObject()
@@ -701,16 +1492,16 @@ class XFileParser:
 
     def ParseDataObjectAnimTicksPerSecond(self):
         self.ReadHeadOfDataObject()
-        self.scene.AnimTicksPerSecond = self.ReadInt()
+        self.scene.animTicksPerSecond = self.ReadInt()
         self.CheckForClosingBrace()
 
-    def ParseDataObjectAnimationSet(self):
+    def ParseDataObjectAnimationSet(self) -> Animation:
         animName = self.ReadHeadOfDataObject()
 
         anim = Animation()
-        self.scene.anims.append(anim)
         anim.name = animName.decode()
 
+        handlers = DATA_OBJECT_HANDLERS[b'AnimationSet']
         running = True
         while running:
             objectName = self.GetNextToken()
@@ -719,17 +1510,22 @@ class XFileParser:
                     "Unexpected end of file while parsing animation set.")
             elif objectName == b'}':
                 break  # animation set finished
-            elif objectName == b'Animation':
-                self.ParseDataObjectAnimation(anim)
+            elif self.IsSkipped(objectName):
+                self.SkipDataObject()
+            elif objectName in handlers:
+                handlers[objectName](self, anim)
             else:
                 warn('Unknown data object in animation set in x file')
                 self.ParseUnknownDataObject()
 
+        return anim
+
     def ParseDataObjectAnimation(self, anim: Animation):
         self.ReadHeadOfDataObject()
         banim = AnimBone()
         anim.anims.append(banim)
 
+        handlers = DATA_OBJECT_HANDLERS[b'Animation']
         running = True
         while running:
             objectName = self.GetNextToken()
@@ -739,13 +1535,13 @@ class XFileParser:
                     "Unexpected end of file while parsing animation.")
             elif objectName == b'}':
                 break
-            elif objectName == b'AnimationKey':
-                self.ParseDataObjectAnimationKey(banim)
-            elif objectName == b'AnimationOptions':
-                self.ParseUnknownDataObject()
             elif objectName == b'{':
-                banim.boneName = self.GetNextToken()
+                banim.boneName = self.GetNextToken().decode()
                 self.CheckForClosingBrace()
+            elif self.IsSkipped(objectName):
+                self.SkipDataObject()
+            elif objectName in handlers:
+                handlers[objectName](self, banim)
             else:
                 warn("Unknown data object in animation in x file")
                 self.ParseUnknownDataObject()
@@ -840,39 +1636,198 @@ class XFileParser:
             name = name.replace(b'\\\\', b'\\', 1)
         return name
 
-    def ParseUnknownDataObject(self):
-        # find opening delimiter
-        running = True
-        while running:
-            t = self.GetNextToken()
-            if len(t) == 0:
+    def IsDecoded(self, objectName: bytes) -> bool:
+        """ tests whether data objects of the given template are decoded if there is no handler """
+        return self.decodeUnknown and objectName in self.templates
+
+    def IsSkipped(self, objectName: bytes, topLevel: bool = False) -> bool:
+        """ tests whether data objects of the given template are filtered out.
+        include only filters top-level data objects, nested ones only by exclude
+        """
+        if topLevel and self.include is not None and objectName not in self.include \
+                and objectName != b'template':
+            return True
+        return objectName in self.exclude
+
+    def SkipDataObject(self):
+        """ skips the data object following its template name by matching braces,
+        without tokenizing its content
+        """
+        depth = 0
+        if self.isBinaryFormat:
+            self.binaryNumCount = 0
+            while True:
+                tok = self.NextBinToken()
+                if tok == 0:
+                    self.ThrowException(
+                        "Unexpected end of file while parsing unknown segment.")
+                if tok == 0x0a:
+                    depth += 1
+                elif tok == 0x0b:
+                    depth -= 1
+                    if depth <= 0:
+                        return
+
+        pos = self.p
+        while True:
+            c, start, pos = self.FindNextTextDelimiter(pos)
+            if not c:
                 self.ThrowException(
                     "Unexpected end of file while parsing unknown segment.")
+            if c == b'{':
+                depth += 1
+            elif c == b'}':
+                depth -= 1
+                if depth <= 0:
+                    break
+        self.lineNumber += self.CountLines(self.p, pos)
+        self.p = pos
 
-            if t == b"{":
+    def ParseUnknownDataObject(self, objectName: bytes = b'', dataObjects: list[DataObject] | None = None):
+        """ ignores unknown data objects and the ones the importer does not use.
+        If dataObjects is given, data objects of known templates are decoded into it
+        instead, and skipped only if their data does not match the template
+        """
+        if dataObjects is not None and objectName in self.templates:
+            p, lineNumber, binaryNumCount = self.p, self.lineNumber, self.binaryNumCount
+            try:
+                dataObjects.append(self.ParseDataObjectGeneric(objectName))
+                return
+            except (ImportError, ValueError) as e:
+                warn("Data object does not match template %s: %s" % (objectName.decode(errors='replace'), e))
+                self.p, self.lineNumber, self.binaryNumCount = p, lineNumber, binaryNumCount
+        self.SkipDataObject()
+
+    def ParseDataObjectGeneric(self, objectName: bytes) -> DataObject:
+        """ decodes a data object following its template name through its template """
+        dataObject = DataObject()
+        dataObject.templateName = objectName.decode()
+        dataObject.name = self.ReadHeadOfDataObject().decode()
+        dataObject.values = self.ReadTemplateMembers(objectName)
+
+        # nested data objects
+        running = True
+        while running:
+            objectName = self.GetNextToken()
+            if not objectName:
+                self.ThrowException(
+                    "Unexpected end of file while parsing %s." % dataObject.templateName)
+            elif objectName == b'}':
                 break
+            elif objectName == b'{':
+                dataObject.references.append(self.GetNextToken().decode())
+                self.CheckForClosingBrace()
+            elif objectName == b';' or objectName == b',':
+                pass
+            elif self.IsSkipped(objectName):
+                self.SkipDataObject()
+            elif objectName in self.templates:
+                self.ParseUnknownDataObject(objectName, dataObject.children)
+            else:
+                warn("Unknown data object in %s in x file" % dataObject.templateName)
+                self.ParseUnknownDataObject()
 
-        counter = 1
-
-        # parse until closing delimiter
-        while counter > 0:
-            t = self.GetNextToken()
-
-            if len(t) == 0:
-                self.ThrowException(
-                    "Unexpected end of file while parsing unknown segment.")
+        return dataObject
 
-            if t == b"{":
-                counter += 1
-            elif t == b"}":
-                counter -= 1
-        return
+    def CompileLayout(self, typeName: bytes) -> TemplateLayout | None:
+        """ compiles the layout of a primitive type or a template. Returns None for
+        strings and templates of variable size
+        """
+        if typeName in self.templateLayouts:
+            return self.templateLayouts[typeName]
+        upper = typeName.upper()
+        if upper not in PRIMITIVE_TYPES and upper not in STRING_TYPES and typeName not in self.templates:
+            self.ThrowException("Unknown template %s." % typeName.decode(errors='replace'))
+        # also stops recursive templates
+        self.templateLayouts[typeName] = None
+        layout = None
+        if upper in PRIMITIVE_TYPES:
+            dtype = PRIMITIVE_TYPES[upper]
+            if dtype is None:
+                dtype = '<f8' if self.binaryFloatSize == 64 else '<f4'
+            layout = TemplateLayout(np.dtype(dtype))
+        elif upper not in STRING_TYPES:
+            template = self.templates[typeName]
+            fields = []
+            for member in template.members:
+                memberLayout = self.CompileLayout(member.typeName)
+                if memberLayout is None or not all(isinstance(d, int) for d in member.dimensions):
+                    return None
+                fields.append((member.name.decode(), memberLayout.dtype, tuple(member.dimensions)))
+            layout = TemplateLayout(np.dtype(fields))
+        self.templateLayouts[typeName] = layout
+        return layout
+
+    def ReadTemplateMembers(self, typeName: bytes) -> dict[str, np.ndarray | dict | list]:
+        """ reads the members of a template by name """
+        values = {}
+        for member in self.templates[typeName].members:
+            shape = []
+            for size in member.dimensions:
+                if not isinstance(size, int):
+                    value = values.get(size.decode())
+                    if not isinstance(value, np.ndarray) or value.dtype.kind not in 'iu':
+                        self.ThrowException("Invalid array size %s." % size.decode(errors='replace'))
+                    size = int(value)
+                shape.append(size)
+            values[member.name.decode()] = self.ReadTemplateValues(member.typeName, tuple(shape))
+        return values
+
+    def ReadTemplateValues(self, typeName: bytes, shape: tuple[int, ...]) -> np.ndarray | dict | list:
+        """ reads an array of the given shape of a primitive type or a template """
+        count = int(np.prod(shape))
+        if typeName.upper() in STRING_TYPES:
+            strings = [self.GetNextTokenAsString() for a in range(count)]
+            return np.array(strings, np.bytes_).reshape(shape)
+        layout = self.CompileLayout(typeName)
+        if layout is None:
+            # in text files, a separator follows every template value
+            elements = []
+            for a in range(count):
+                elements.append(self.ReadTemplateMembers(typeName))
+                self.TestForSeparator()
+            return elements if shape else elements[0]
+
+        # the values of fixed size layouts are read at once, as one number list in binary files
+        numLeaves = len(layout.leaves)
+        groupSize = numLeaves if layout.dtype.names is not None else 0
+        numValues = count * numLeaves
+        if numValues == 0:
+            return np.zeros(shape, layout.dtype)
+        if layout.kind == 'f':
+            values = self.ReadFloatArray(numValues, groupSize)
+        elif layout.kind == 'i':
+            values = self.ReadIntArray(numValues, groupSize)
+        else:
+            # integers and floats come in separate lists, so they are read one by one
+            values = np.zeros(numValues, np.float64)
+            for a in range(numValues):
+                leaf = layout.leaves[a % numLeaves]
+                if leaf.kind == 'f':
+                    values[a] = self.ReadFloat()
+                else:
+                    # wrapped around like the unsafe casts below
+                    values[a] = np.array(self.ReadInt(), np.int64).astype(leaf)
+                if (a + 1) % numLeaves == 0:
+                    self.TestForSeparator()
+        if layout.dtype.names is None:
+            return values.astype(layout.dtype).reshape(shape)
+        records = np.lib.recfunctions.unstructured_to_structured(
+            values.reshape(count, numLeaves), layout.dtype, casting='unsafe')
+        return records.reshape(shape)
 
     def FindNextNoneWhiteSpace(self):
         """ places pointer to next begin of a token, and ignores comments """
         if self.isBinaryFormat:
             return
 
+        if self.tokenizer == TOKENIZER_REGEX:
+            m = RE_WHITESPACE.match(self.buffer, self.p, self.end)
+            if m:
+                self.lineNumber += m.group().count(b'\n')
+                self.p = m.end()
+            return
+
         running = True
         while running:
             while (self.p < self.end) and (self.buffer[self.p:self.p+1] == b' ' or self.buffer[self.p:self.p+1] == b'\r' or self.buffer[self.p:self.p+1] == b'\n'):
@@ -899,9 +1854,12 @@ class XFileParser:
             if self.end-self.p < 2:
                 return s
             tok = self.ReadBinWord()
+            token = BINARY_TOKENS.get(tok)
+            if token is not None:
+                return token
             l = 0
 
-            # standalone tokens
+            # tokens followed by data
             if tok == 1:
                 # name token
                 if self.end-self.p < 4:
@@ -943,58 +1901,8 @@ class XFileParser:
                 if self.end - self.p < 4:
                     return s
                 l = self.ReadBinDWord()
-                self.p += l * self.binaryFloatSize
+                self.p += l * (self.binaryFloatSize // 8)
                 return b'<flt_list>'
-            elif tok == 0x0a:
-                return b'{'
-            elif tok == 0x0b:
-                return b'}'
-            elif tok == 0x0c:
-                return b'('
-            elif tok == 0x0d:
-                return b')'
-            elif tok == 0x0e:
-                return b'['
-            elif tok == 0x0f:
-                return b']'
-            elif tok == 0x10:
-                return b'<'
-            elif tok == 0x11:
-                return b'>'
-            elif tok == 0x12:
-                return b"."
-            elif tok == 0x13:
-                return b","
-            elif tok == 0x14:
-                return b";"
-            elif tok == 0x1f:
-                return b"template"
-            elif tok == 0x28:
-                return b"WORD"
-            elif tok == 0x29:
-                return b"DWORD"
-            elif tok == 0x2a:
-                return b"FLOAT"
-            elif tok == 0x2b:
-                return b"DOUBLE"
-            elif tok == 0x2c:
-                return b"CHAR"
-            elif tok == 0x2d:
-                return b"UCHAR"
-            elif tok == 0x2e:
-                return b"SWORD"
-            elif tok == 0x2f:
-                return b"SDWORD"
-            elif tok == 0x30:
-                return b"void"
-            elif tok == 0x31:
-                return b"string"
-            elif tok == 0x32:
-                return b"unicode"
-            elif tok == 0x33:
-                return b"cstring"
-            elif tok == 0x34:
-                return b"array"
 
         # process text-formatted file
         else:
@@ -1002,6 +1910,13 @@ class XFileParser:
             if self.p >= self.end:
                 return s
 
+            if self.tokenizer == TOKENIZER_REGEX:
+                m = RE_TOKEN.match(self.buffer, self.p, self.end)
+                if m:
+                    s = m.group()
+                    self.p = m.end()
+                return s
+
             while (self.p < self.end) and (not str.isspace(chr(self.buffer[self.p]))):
                 # either keep token delimiters when already holding a token, or return if first valid char
                 tmp = self.buffer[self.p:self.p+1]
@@ -1070,6 +1985,18 @@ class XFileParser:
         if self.p >= self.end:
             self.ThrowException("Unexpected end of file while parsing string")
 
+        if self.tokenizer == TOKENIZER_REGEX:
+            m = RE_STRING.match(self.buffer, self.p, self.end)
+            if not m:
+                if self.buffer[self.p:self.p+1] != b'"':
+                    self.ThrowException("Expected quotation mark.")
+                self.ThrowException("Unexpected end of file while parsing string")
+            if not m.group(2):
+                self.ThrowException(
+                    "Expected quotation mark and semicolon at the end of a string.")
+            self.p = m.end()
+            return m.group(1)
+
         if self.buffer[self.p:self.p+1] != b'"':
             self.ThrowException("Expected quotation mark.")
         self.p += 1
@@ -1109,14 +2036,44 @@ class XFileParser:
         self.p += 4
         return tmp
 
+    def ReadBinListHead(self, listToken: int) -> int:
+        """ starts the next number list if the current one is used up and
+        returns the count of numbers left in it. A single number not wrapped
+        in a list counts as a list of one
+        """
+        if self.binaryNumCount == 0 and (self.end-self.p >= 2):
+            tmp = self.ReadBinWord()
+            if tmp == listToken and (self.end-self.p >= 4):
+                self.binaryNumCount = self.ReadBinDWord()
+            else:
+                self.binaryNumCount = 1
+        return self.binaryNumCount
+
+    def ReadBinArray(self, count: int, listToken: int, dtype: str) -> np.ndarray:
+        """ reads count numbers from <int_list> or <flt_list> tokens. The numbers
+        of a single list are returned as a read-only view into the buffer
+        """
+        itemSize = np.dtype(dtype).itemsize
+        chunks = []
+        while count > 0 and self.ReadBinListHead(listToken) > 0:
+            n = min(count, self.binaryNumCount, (self.end-self.p) // itemSize)
+            if n <= 0:
+                self.p = self.end
+                break
+            chunks.append(np.frombuffer(self.buffer, dtype, n, self.p))
+            self.p += n * itemSize
+            self.binaryNumCount -= n
+            count -= n
+        if count > 0:
+            # unexpected end of file, ReadInt and ReadFloat return 0 here as well
+            chunks.append(np.zeros(count, dtype))
+        if len(chunks) == 1:
+            return chunks[0]
+        return np.concatenate(chunks)
+
     def ReadInt(self) -> int:
         if self.isBinaryFormat:
-            if self.binaryNumCount == 0 and (self.end-self.p >= 2):
-                tmp = self.ReadBinWord()
-                if tmp == 0x06 and (self.end-self.p >= 4):
-                    self.binaryNumCount = self.ReadBinDWord()
-                else:
-                    self.binaryNumCount = 1
+            self.ReadBinListHead(0x06)
 
             self.binaryNumCount -= 1
             if self.end-self.p >= 4:
@@ -1127,10 +2084,19 @@ class XFileParser:
         else:
             self.FindNextNoneWhiteSpace()
 
+            if self.tokenizer == TOKENIZER_REGEX:
+                m = RE_INT.match(self.buffer, self.p, self.end)
+                if not m:
+                    self.ThrowException('Number expected.')
+                self.p = m.end()
+                if m.end(1) == self.p:
+                    self.CheckForSeparator()
+                return int(m.group(1))
+
             # check preceeding minus sign
             isNegative = False
             if self.buffer[self.p:self.p+1] == b'-':
-                isNegative = False
+                isNegative = True
                 self.p += 1
             # at least one digit expected
             if not self.buffer[self.p:self.p+1].isdigit():
@@ -1152,14 +2118,9 @@ class XFileParser:
 
     def ReadFloat(self) -> float:
         if self.isBinaryFormat:
-            if (self.binaryNumCount == 0) and (self.end - self.p >= 2):
-                tmp = self.ReadBinWord()
-                if(tmp == 0x07) and (self.end - self.p >= 4):
-                    self.binaryNumCount = self.ReadBinDWord()
-                else:
-                    self.binaryNumCount = 1
+            self.ReadBinListHead(0x07)
             self.binaryNumCount -= 1
-            if self.binaryFloatSize == 8:
+            if self.binaryFloatSize == 64:
                 if self.end-self.p >= 8:
                     result = struct.unpack_from('d', self.buffer, self.p)[0]
                     self.p += 8
@@ -1182,10 +2143,26 @@ class XFileParser:
         # I mean you, Blender!
         # Reading is safe because of the terminating zero
 
-        if self.buffer[self.p:self.p+9] == b'-1.#IND00' or self.buffer[self.p:self.p+8] == b'1.#IND00':
+        if self.tokenizer == TOKENIZER_REGEX:
+            m = RE_FLOAT.match(self.buffer, self.p, self.end)
+            if not m:
+                self.ThrowException('Number expected.')
+            self.p = m.end()
+            if m.end(1) == self.p:
+                self.CheckForSeparator()
+            tmp = m.group(1)
+            if b'#' in tmp:
+                return 0.0
+            return float(tmp)
+
+        if self.buffer[self.p:self.p+9] == b'-1.#IND00':
             self.p += 9
             self.CheckForSeparator()
             return 0.0
+        elif self.buffer[self.p:self.p+8] == b'1.#IND00':
+            self.p += 8
+            self.CheckForSeparator()
+            return 0.0
         elif self.buffer[self.p:self.p+8] == b'1.#QNAN0':
             self.p += 8
             self.CheckForSeparator()
@@ -1193,7 +2170,6 @@ class XFileParser:
         result_ = 0.0
         #tmp_ = ''
         digitStart = self.p
-        digitEnd = self.p
         notSplitChar = [b'0', b'1', b'2', b'3', b'4', b'5',
                         b'6', b'7', b'8', b'9', b'+', b'.', b'-', b'e', b'E']
         while self.p < self.end:
@@ -1201,11 +2177,10 @@ class XFileParser:
             # if c.isdigit() or c=='+' or c=='.' or c=='-' or c=='e' or c=='E':
             if c in notSplitChar:
                 #tmp_ += c
-                digitEnd = self.p
                 self.p += 1
             else:
                 break
-        tmp = self.buffer[digitStart:digitEnd]
+        tmp = self.buffer[digitStart:self.p]
         result_ = float(tmp)
         self.CheckForSeparator()
         return result_
@@ -1238,6 +2213,127 @@ class XFileParser:
         self.TestForSeparator()
         return (r, g, b, a)
 
+    def ReadFloatArray(self, count: int, groupSize: int = 0) -> np.ndarray:
+        """ reads count floats at once. If groupSize is given, the values are read
+        in groups like ReadVector3 does, testing for a separator after each group
+        """
+        if count <= 0:
+            return np.zeros(0, np.float64)
+        if self.isBinaryFormat:
+            return self.ReadBinArray(count, 0x07, '<f8' if self.binaryFloatSize == 64 else '<f4')
+        if self.tokenizer == TOKENIZER_REGEX:
+            values = self.ReadNumberBlock(
+                RE_FLOAT_RUN, count, np.float64, groupSize > 0)
+            if values is not None:
+                return values
+
+        values = [0.0] * count
+        for a in range(count):
+            values[a] = self.ReadFloat()
+            if groupSize and (a + 1) % groupSize == 0:
+                self.TestForSeparator()
+        return np.array(values, np.float64)
+
+    def ReadIntArray(self, count: int, groupSize: int = 0) -> np.ndarray:
+        """ reads count integers at once. If groupSize is given, the values are read
+        in groups like ReadFloatArray does
+        """
+        if count <= 0:
+            return np.zeros(0, np.int64)
+        if self.isBinaryFormat:
+            return self.ReadBinArray(count, 0x06, '<u4')
+        if self.tokenizer == TOKENIZER_REGEX:
+            values = self.ReadNumberBlock(RE_INT_RUN, count, np.int64, groupSize > 0)
+            if values is not None:
+                return values
+
+        values = [0] * count
+        for a in range(count):
+            values[a] = self.ReadInt()
+            if groupSize and (a + 1) % groupSize == 0:
+                self.TestForSeparator()
+        return np.array(values, np.int64)
+
+    def ReadFaceArray(self, numFaces: int) -> tuple[np.ndarray, np.ndarray]:
+        """ reads numFaces faces, each an index count followed by the indices.
+        Returns the offsets of each face into the index array and the index array
+        """
+        if numFaces <= 0:
+            return np.zeros(1, np.int64), np.zeros(0, np.int64)
+        if self.isBinaryFormat:
+            # split the faces inside the current <int_list> before consuming them
+            available = min(self.ReadBinListHead(0x06), (self.end-self.p) // 4)
+            values = np.frombuffer(self.buffer, '<u4', max(available, 0), self.p)
+            faces = SplitFaces(values, numFaces)
+            if faces is not None:
+                offsets, indices, total = faces
+                self.ReadBinArray(total, 0x06, '<u4')
+                return offsets, indices
+        elif self.tokenizer == TOKENIZER_REGEX:
+            m = RE_INT_RUN.match(self.buffer, self.p, self.end)
+            try:
+                values = np.array(m.group().translate(
+                    SEPARATORS_TO_SPACE).split(), np.int64)
+            except ValueError:
+                values = None
+            if values is not None:
+                faces = SplitFaces(values, numFaces)
+                if faces is not None:
+                    offsets, indices, total = faces
+                    if self.ReadNumberBlock(RE_INT_RUN, total, np.int64, True) is not None:
+                        return offsets, indices
+
+        values = []
+        sizes = [0] * numFaces
+        for a in range(numFaces):
+            numIndices = self.ReadInt()
+            sizes[a] = numIndices
+            for b in range(numIndices):
+                values.append(self.ReadInt())
+            self.TestForSeparator()
+        offsets = np.zeros(numFaces + 1, np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        return offsets, np.array(values, np.int64)
+
+    def ReadNumberBlock(self, run: re.Pattern, count: int, dtype: type, testSeparator: bool) -> np.ndarray | None:
+        """ converts the next count numbers of the text buffer in one pass.
+        Returns None without moving the read position if the block can't be read
+        this way, e.g. because of comments between the numbers
+        """
+        block = run.match(self.buffer, self.p, self.end).group()
+        tokens = block.translate(SEPARATORS_TO_SPACE).split(None, count)
+        if len(tokens) < count:
+            return None
+        stop = len(block)
+        if len(tokens) > count:
+            stop -= len(tokens.pop())
+        last = tokens[-1]
+        lastEnd = block.rfind(last, 0, stop) + len(last)
+
+        try:
+            values = np.array(tokens, dtype)
+        except ValueError:
+            # values written by faulty exporters
+            tokens = [b'0' if b'#' in t else t for t in tokens]
+            try:
+                values = np.array(tokens, dtype)
+            except ValueError:
+                return None
+
+        # a separator follows every number, and optionally another one the block ends with
+        p = self.p + lastEnd
+        m = RE_SEPARATOR.match(self.buffer, p, self.end)
+        if not m:
+            return None
+        p = m.end()
+        if testSeparator:
+            m = RE_SEPARATOR.match(self.buffer, p, self.end)
+            if m:
+                p = m.end()
+        self.lineNumber += block.count(b'\n', 0, p - self.p)
+        self.p = p
+        return values
+
     def ThrowException(self, text: str):
         """Throws an exception with a line number and the given text."""
         if(self.isBinaryFormat):
@@ -1270,3 +2366,83 @@ class XFileParser:
         # recurse
         for a in range(0, len(node.children)):
             self.FilterHierarchy(node.children[a])
+
+
+# A data object handler is called with the parser, positioned after the template
+# name of the data object, and with the scene, frame node, mesh, material,
+# animation set or animation bone the data object belongs to. It reads the data
+# object up to its closing brace.
+DataObjectHandler = Callable[[XFileParser, object], None]
+
+# data object handlers by the template name of the enclosing data object and
+# their own template name. The empty name holds those of top-level data objects
+DATA_OBJECT_HANDLERS: dict[bytes, dict[bytes, DataObjectHandler]] = {
+    b'': {
+        b'template': lambda parser, scene: parser.ParseDataObjectTemplate(),
+        b'Frame': lambda parser, scene: parser.ParseDataObjectFrame(),
+        b'Mesh': lambda parser, scene: scene.globalMeshes.append(parser.ParseDataObjectMesh()),
+        b'AnimTicksPerSecond': lambda parser, scene: parser.ParseDataObjectAnimTicksPerSecond(),
+        b'AnimationSet': lambda parser, scene: scene.anims.append(parser.ParseDataObjectAnimationSet()),
+        b'Material': lambda parser, scene: scene.globalMaterials.append(parser.ParseDataObjectMaterial()),
+    },
+    b'Frame': {
+        b'Frame': XFileParser.ParseDataObjectFrame,
+        b'FrameTransformMatrix': lambda parser, node: setattr(
+            node, 'trafoMatrix', parser.ParseDataObjectTransformationMatrix()),
+        b'Mesh': lambda parser, node: node.meshes.append(parser.ParseDataObjectMesh()),
+    },
+    b'Mesh': {
+        b'MeshNormals': XFileParser.ParseDataObjectMeshNormals,
+        b'MeshTextureCoords': XFileParser.ParseDataObjectMeshTextureCoords,
+        b'MeshVertexColors': XFileParser.ParseDataObjectMeshVertexColors,
+        b'MeshMaterialList': XFileParser.ParseDataObjectMeshMaterialList,
+        # we'll ignore vertex duplication indices
+        b'VertexDuplicationIndices': lambda parser, mesh: parser.ParseUnknownDataObject(),
+        b'XSkinMeshHeader': XFileParser.ParseDataObjectSkinMeshHeader,
+        b'SkinWeights': XFileParser.ParseDataObjectSkinWeights,
+    },
+    b'MeshMaterialList': {
+        b'Material': lambda parser, mesh: mesh.materials.append(parser.ParseDataObjectMaterial()),
+    },
+    b'Material': {
+        b'TextureFilename': lambda parser, material: material.textures.append(
+            TexEntry(parser.ParseDataObjectTextureFilename())),
+        # one exporter writes out the normal map in a separate filename tag
+        b'NormalmapFilename': lambda parser, material: material.textures.append(
+            TexEntry(parser.ParseDataObjectTextureFilename(), True)),
+    },
+    b'AnimationSet': {
+        b'Animation': XFileParser.ParseDataObjectAnimation,
+    },
+    b'Animation': {
+        b'AnimationKey': XFileParser.ParseDataObjectAnimationKey,
+        b'AnimationOptions': lambda parser, animBone: parser.ParseUnknownDataObject(),
+    },
+}
+# some exporters write "TextureFileName" instead.
+DATA_OBJECT_HANDLERS[b'Material'][b'TextureFileName'] = DATA_OBJECT_HANDLERS[b'Material'][b'TextureFilename']
+DATA_OBJECT_HANDLERS[b'Material'][b'NormalmapFileName'] = DATA_OBJECT_HANDLERS[b'Material'][b'NormalmapFilename']
+
+
+def RegisterDataObjectHandler(name: str | bytes, handler: DataObjectHandler | None,
+                              parent: str | bytes = '') -> DataObjectHandler | None:
+    """Registers the handler of data objects of a template, e.g. of one an exporter
+    declares in the file, or replaces the one of a standard template.
+    Returns the handler registered before, None removes the handler.
+
+    Handlers are registered for the process. Worker processes of ParseXFiles
+    only know the handlers registered when this module is imported, and scenes
+    loaded from a parse cache lack what the handlers add to them.
+
+    Args:
+        name: template name of the data objects
+        handler: called with the parser and the object the data object belongs to
+        parent: template name of the enclosing data objects, one of the keys of
+            DATA_OBJECT_HANDLERS. The empty name registers a top-level data object
+    """
+    name, parent = (n.encode() if isinstance(n, str) else n for n in (name, parent))
+    handlers = DATA_OBJECT_HANDLERS[parent]
+    previous = handlers.pop(name, None)
+    if handler is not None:
+        handlers[name] = handler
+    return previous